@@ -1997,18 +1997,32 @@
 
 
 
-from flask import Flask, render_template, request, redirect, json, make_response, jsonify
+from flask import Flask, render_template, stream_template, request, redirect, json, make_response, jsonify, Response, stream_with_context
 import os
+import re
+import base64
+import time
+import shutil
+import tempfile
+import uuid
+import pickle
+import threading
+import atexit
+import multiprocessing
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
 from dotenv import load_dotenv
-from pymongo import MongoClient
+from pymongo import MongoClient, ReplaceOne, DeleteOne, UpdateOne
 from datetime import datetime
 import pytz
 import pandas as pd
+import numpy as np
+from openpyxl import load_workbook, Workbook
 from werkzeug.utils import secure_filename
-import io
 import csv
 from io import StringIO, BytesIO
 from bson import ObjectId
+from itertools import groupby
+from bisect import bisect_right
 
 load_dotenv()
 
@@ -2022,41 +2036,113 @@ client = MongoClient(MONGO_URI, w=1, retryWrites=True, socketTimeoutMS=20000)
 db = client.get_database("cutm1")
 cutm_collection = db.get_collection("CUTM1")
 cbcs_collection = db.get_collection("cbcs")
+student_summary_collection = db.get_collection("student_summary")
+ingest_jobs_collection = db.get_collection("ingest_jobs")
+cohort_versions_collection = db.get_collection("cohort_versions")
+cache_versions_collection = db.get_collection("cache_versions")
+
+INGEST_JOB_TTL_SECONDS = 7 * 24 * 3600
+
+CBCS_INDEXES = [
+    [("Subject_Code", 1)],
+    [("Branch", 1)],
+    [("Basket", 1)],
+    [("Subject_Code", 1), ("Branch", 1)],
+    [("Branch_Tokens", 1)],
+    [("Subject Code", 1), ("_id", 1)],
+    [("Branch", 1), ("Basket", 1), ("Subject Code", 1), ("_id", 1)]
+]
 
 # ---------------- Indexes ----------------
+def create_cbcs_indexes(collection):
+    """Build the CBCS catalogue indexes on a collection (live or staging)"""
+    for keys in CBCS_INDEXES:
+        collection.create_index(keys)
+
 def ensure_indexes():
     try:
         cutm_collection.create_index([("Reg_No", 1)])
         cutm_collection.create_index([("Sem", 1)])
         cutm_collection.create_index([("Reg_No", 1), ("Sem", 1)])
-        cutm_collection.create_index([("Name", 1)])
+        cutm_collection.create_index([("Name_Key", 1), ("Sem", 1)])
+        cutm_collection.create_index([("Grade", 1), ("Branch_Code", 1), ("Batch_Year", 1)])
+        cutm_collection.create_index([("Batch_Year", 1), ("Branch_Code", 1), ("Reg_No", 1), ("Sem", 1), ("Subject_Code", 1)])
+        cutm_collection.create_index([("Batch_Year", 1), ("Reg_No", 1), ("Sem", 1), ("Subject_Code", 1)])
+        cutm_collection.create_index([("Branch_Code", 1), ("Reg_No", 1), ("Sem", 1), ("Subject_Code", 1)])
         cutm_collection.create_index([("Subject_Code", 1)])
         
-        cbcs_collection.create_index([("Subject_Code", 1)])
-        cbcs_collection.create_index([("Branch", 1)])
-        cbcs_collection.create_index([("Basket", 1)])
-        cbcs_collection.create_index([("Subject_Code", 1), ("Branch", 1)])
+        create_cbcs_indexes(cbcs_collection)
+
+        student_summary_collection.create_index([("Reg_No", 1)], unique=True)
+        student_summary_collection.create_index([("Batch", 1), ("Branch", 1), ("Reg_No", 1)])
+
+        ingest_jobs_collection.create_index([("created_at", 1)], expireAfterSeconds=INGEST_JOB_TTL_SECONDS)
+
+        cohort_versions_collection.create_index([("Batch_Year", 1), ("Branch_Code", 1)], unique=True)
     except Exception:
         pass
 
-ensure_indexes()
+# Spawned parse workers import this module too; only the app process touches the indexes
+if multiprocessing.parent_process() is None:
+    ensure_indexes()
 
 # ---------------- Branch Identification ----------------
+BRANCH_NAMES = {
+    '1': 'Civil Engineering',
+    '2': 'Computer Science Engineering', 
+    '3': 'Electronics & Communication Engineering',
+    '5': 'Electrical & Electronics Engineering',
+    '6': 'Mechanical Engineering'
+}
+BRANCH_TOKEN_ALL = 'All'
+BRANCH_ALIASES = {
+    'civil': '1', 'ce': '1', 'civil engineering': '1',
+    'cse': '2', 'cs': '2', 'computer': '2', 'computer science': '2',
+    'computer science engineering': '2', 'computer science & engineering': '2',
+    'ece': '3', 'electronics': '3', 'electronics & communication': '3',
+    'electronics & communication engineering': '3', 'electronics and communication engineering': '3',
+    'eee': '5', 'ee': '5', 'electrical': '5', 'electrical & electronics': '5',
+    'electrical & electronics engineering': '5', 'electrical and electronics engineering': '5',
+    'mechanical': '6', 'mech': '6', 'me': '6', 'mechanical engineering': '6'
+}
+# Multi-word aliases are matched (longest first) before a segment is split into words,
+# so 'Electrical & Electronics' never falls back to the ECE 'electronics' word
+BRANCH_PHRASE_PATTERN = re.compile(r'(?<![\w&])(' + '|'.join(
+    re.escape(alias) for alias in sorted((a for a in BRANCH_ALIASES if ' ' in a), key=len, reverse=True)
+) + r')(?![\w&])')
+
+def branch_tokens(branch):
+    """Canonical branch codes a free-text CBCS Branch value applies to ('All' expands to every branch)"""
+    tokens = set()
+    for segment in re.split(r'[/,;|+]', str(branch or '')):
+        segment = re.sub(r'\s+', ' ', re.sub(r'\band\b', '&', segment.strip().lower()))
+        if not segment:
+            continue
+        if segment not in BRANCH_ALIASES and segment != 'all':
+            for phrase in BRANCH_PHRASE_PATTERN.findall(segment):
+                tokens.add(BRANCH_ALIASES[phrase])
+            segment = BRANCH_PHRASE_PATTERN.sub(' ', segment)
+        words = [segment] if segment in BRANCH_ALIASES or segment == 'all' else re.split(r'[\s&-]+', segment)
+        for word in words:
+            if word == 'all':
+                tokens.update(BRANCH_NAMES)
+                tokens.add(BRANCH_TOKEN_ALL)
+            elif word in BRANCH_ALIASES:
+                tokens.add(BRANCH_ALIASES[word])
+    return sorted(tokens)
+
 def get_branch_from_reg_no(reg_no):
     """Extract branch name from registration number"""
-    branch_codes = {
-        '1': 'Civil Engineering',
-        '2': 'Computer Science Engineering', 
-        '3': 'Electronics & Communication Engineering',
-        '5': 'Electrical & Electronics Engineering',
-        '6': 'Mechanical Engineering'
-    }
-    
     if len(str(reg_no)) >= 10:
         branch_code = str(reg_no)[7:8]
-        return branch_codes.get(branch_code, 'Unknown Branch')
+        return BRANCH_NAMES.get(branch_code, 'Unknown Branch')
     return 'Invalid Registration'
 
+def get_branch_short_from_code(branch_code):
+    """Short branch label (e.g. 'Civil') for a stored Branch_Code"""
+    branch = BRANCH_NAMES.get(branch_code)
+    return branch.split()[0] if branch else 'Unknown'
+
 def get_year_from_reg_no(reg_no):
     """Extract admission year from registration number"""
     year_codes = {
@@ -2069,6 +2155,25 @@ def get_year_from_reg_no(reg_no):
         return year_codes.get(year_code, f'20{year_code}')
     return 'Unknown'
 
+def get_branch_code_from_reg_no(reg_no):
+    """Extract the single-digit branch code from registration number"""
+    if len(str(reg_no)) >= 10:
+        return str(reg_no)[7:8]
+    return ''
+
+def get_semester_number(sem):
+    """Extract the numeric semester from values like 'Sem 3'"""
+    match = re.search(r'\d+', str(sem or ''))
+    return int(match.group()) if match else None
+
+def derived_result_fields(reg_no, sem):
+    """Branch/batch/semester keys stored on CUTM1 rows for indexed filtering"""
+    return {
+        "Branch_Code": get_branch_code_from_reg_no(reg_no),
+        "Batch_Year": get_year_from_reg_no(reg_no),
+        "Sem_No": get_semester_number(sem)
+    }
+
 def get_branch_code_mapping():
     """Get branch name to code mapping for search"""
     return {
@@ -2089,46 +2194,61 @@ def convert_to_ist(gmt_time):
     return gmt_time.astimezone(ist_timezone).strftime('%Y-%m-%d %I:%M:%S %p IST')
 
 GRADE_MAP = {'O': 10, 'E': 9, 'A': 8, 'B': 7, 'C': 6, 'D': 5, 'S': 0, 'M': 0, 'F': 0, "I": 0, "R": 0}
+BACKLOG_GRADES = ["F", "M", "S", "I", "R"]
 
 def convert_grade_to_integer(grade):
     return GRADE_MAP.get(grade, 0)
 
+def grade_point(grade):
+    """Map a grade letter (or a numeric grade point) to its numeric value"""
+    if isinstance(grade, str) and grade.strip().upper() in GRADE_MAP:
+        return GRADE_MAP[grade.strip().upper()]
+    try:
+        return float(grade)
+    except (TypeError, ValueError):
+        return 0
+
+def parse_credit_parts(credit_str):
+    """Split a credit string like '2+0+1' or '2--0--1' into numeric parts"""
+    if credit_str is None:
+        return []
+    parts = str(credit_str).replace('--', '+').split('+')
+    try:
+        return [float(p) for p in parts if p.strip()]
+    except ValueError:
+        return []
+
+def numeric_fields(credits, grade=None):
+    """Precomputed numeric credit / grade-point fields stored alongside a row"""
+    parts = parse_credit_parts(credits)
+    fields = {"Credits_Parts": parts, "Credits_Total": sum(parts)}
+    if grade is not None:
+        fields["Grade_Point"] = grade_point(grade)
+    return fields
+
+def row_credits(row):
+    """Numeric credits of a row, preferring the precomputed Credits_Total"""
+    total = row.get("Credits_Total")
+    if total is None:
+        total = sum(parse_credit_parts(row.get("Credits")))
+    return total
+
+def row_grade_point(row):
+    """Numeric grade point of a row, preferring the precomputed Grade_Point"""
+    point = row.get("Grade_Point")
+    return grade_point(row.get("Grade")) if point is None else point
+
 def calculate_sgpa(result):
     total_credits, total_weighted_grades = 0, 0
     for row in result:
-        credits_str = row.get("Credits") or ""
-        parts = [p for p in str(credits_str).split('+') if p.strip() != ""]
-        if not parts:
+        csum = row_credits(row)
+        if not csum:
             continue
-        credits_parts = [float(part) for part in parts]
-        g = row.get("Grade")
-        grade = convert_grade_to_integer(g) if isinstance(g, str) and g in "OEABCDSMF" else float(g)
-        csum = sum(credits_parts)
         total_credits += csum
-        total_weighted_grades += grade * csum
+        total_weighted_grades += row_grade_point(row) * csum
     sgpa = total_weighted_grades / total_credits if total_credits else 0
     return sgpa, total_credits
 
-def calculate_cgpa(registration, name):
-    cursor = cutm_collection.find(
-        {"$or": [{"Reg_No": registration}, {"Name": {"$regex": f"^{name}$", "$options": "i"}}]},
-        {"Credits": 1, "Grade": 1, "_id": 0}
-    )
-    total_credits, total_weighted_grades = 0, 0
-    for row in cursor:
-        credits_str = row.get("Credits") or ""
-        parts = [p for p in str(credits_str).split('+') if p.strip() != ""]
-        if not parts:
-            continue
-        credits_parts = [float(part) for part in parts]
-        g = row.get("Grade")
-        grade = convert_grade_to_integer(g) if isinstance(g, str) and g in "OEABCDSMF" else float(g)
-        csum = sum(credits_parts)
-        total_credits += csum
-        total_weighted_grades += grade * csum
-    cgpa = total_weighted_grades / total_credits if total_credits else 0
-    return cgpa
-
 # ---------------- Basket Credit Requirements ----------------
 BASKET_CREDIT_REQUIREMENTS = {
     'Basket I': 17,
@@ -2174,11 +2294,551 @@ def parse_credits(credit_str):
     except Exception:
         return 0.0
 
+# ---------------- Transcript Engine ----------------
+TRANSCRIPT_PROJECTION = {
+    "_id": 0, "Credits": 1, "Grade": 1, "Subject_Name": 1,
+    "Subject_Code": 1, "Sem": 1, "Name": 1, "Reg_No": 1,
+    "Credits_Total": 1, "Grade_Point": 1
+}
+
+NAME_KEY_MAX_LENGTH = 100
+
+def normalize_name(name):
+    """Normalize a student name into the indexed Name_Key lookup value"""
+    return str(name or "").strip().lower()[:NAME_KEY_MAX_LENGTH]
+
+def build_student_query(registration, name):
+    """Build the Reg_No / Name match used by the result lookup"""
+    conditions = []
+    if registration:
+        conditions.append({"Reg_No": registration})
+    name_key = normalize_name(name)
+    if name_key:
+        conditions.append({"Name_Key": name_key})
+    if len(conditions) == 1:
+        return conditions[0]
+    return {"$or": conditions}
+
+def sum_credits(rows):
+    """Total the credits of the given rows, skipping unparseable values"""
+    return sum(row_credits(row) for row in rows)
+
+def fetch_transcript(registration, name, semesters=None):
+    """Fetch every record of a student with a single query"""
+    query = build_student_query(registration, name)
+    if semesters:
+        query = {"$and": [query, {"Sem": {"$in": [str(sem).strip() for sem in semesters]}}]}
+    return list(cutm_collection.find(query, TRANSCRIPT_PROJECTION))
+
+def build_transcript(records, selected_semesters, registration):
+    """Compute per-semester SGPA, CGPA and total credits from one set of records"""
+    records_by_sem = {}
+    for row in records:
+        records_by_sem.setdefault(row.get("Sem"), []).append(row)
+
+    semester_results = {}
+    results = []
+    for semester in selected_semesters:
+        semester = str(semester).strip()
+        semester_data = records_by_sem.get(semester)
+        if not semester_data or semester in semester_results:
+            continue
+        sgpa, total_credits = calculate_sgpa(semester_data)
+        semester_results[semester] = {
+            'data': semester_data,
+            'count': len(semester_data),
+            'sgpa': sgpa,
+            'total_credits': total_credits
+        }
+        results.extend(semester_data)
+
+    overall_cgpa = None
+    total_all_semester_credits = 0
+    if registration:
+        total_all_semester_credits = sum_credits(r for r in records if r.get("Reg_No") == registration)
+        overall_cgpa, _ = calculate_sgpa(records)
+
+    return {
+        'results': results,
+        'semester_results': semester_results,
+        'count': len(results),
+        'cgpa': overall_cgpa,
+        'total_all_semester_credits': total_all_semester_credits
+    }
+
+# ---------------- Cohort GPA ----------------
+COHORT_PROJECTION = {"_id": 0, "Reg_No": 1, "Sem": 1, "Credits": 1, "Grade": 1, "Credits_Total": 1, "Grade_Point": 1}
+
+def fill_missing_column(rows, values, fallback_field, parse):
+    """Fill NaN slots of a numeric column by parsing each distinct fallback string once"""
+    missing = np.flatnonzero(np.isnan(values))
+    if len(missing):
+        raw = pd.Series([rows[i].get(fallback_field) for i in missing], dtype=object)
+        parsed = {value: parse(value) for value in raw.unique()}
+        values[missing] = raw.map(parsed).to_numpy(dtype=np.float64)
+    return values
+
+def load_cohort_arrays(records):
+    """Pack cohort rows into student/semester indices and credit/grade-point arrays"""
+    rows = records if isinstance(records, list) else list(records)
+    # Same values as row_credits()/row_grade_point(), built column-wise
+    credits = pd.Series([row.get("Credits_Total") for row in rows], dtype=np.float64).to_numpy(copy=True)
+    points = pd.Series([row.get("Grade_Point") for row in rows], dtype=np.float64).to_numpy(copy=True)
+    fill_missing_column(rows, credits, "Credits", lambda value: sum(parse_credit_parts(value)))
+    fill_missing_column(rows, points, "Grade", grade_point)
+
+    student_idx, students = pd.factorize(pd.Series([row.get("Reg_No") or "" for row in rows], dtype=object), sort=True)
+    sem_idx, semesters = pd.factorize(pd.Series([row.get("Sem") or "" for row in rows], dtype=object), sort=True)
+    return {
+        'students': list(students),
+        'semesters': list(semesters),
+        'student_idx': student_idx.astype(np.int64),
+        'sem_idx': sem_idx.astype(np.int64),
+        'credits': credits,
+        'points': points
+    }
+
+def cohort_gpa_arrays(arrays):
+    """SGPA per (student, semester) and CGPA per student via grouped bincount reductions"""
+    n_students, n_sems = len(arrays['students']), len(arrays['semesters'])
+    # calculate_sgpa() skips rows without credits; bincount then sums in row order like its loop does
+    keep = arrays['credits'] != 0
+    credits = arrays['credits'][keep]
+    weighted = arrays['points'][keep] * credits
+    student_idx = arrays['student_idx'][keep]
+    cell_idx = student_idx * n_sems + arrays['sem_idx'][keep]
+
+    cell_credits = np.bincount(cell_idx, weights=credits, minlength=n_students * n_sems).reshape(n_students, n_sems)
+    cell_weighted = np.bincount(cell_idx, weights=weighted, minlength=n_students * n_sems).reshape(n_students, n_sems)
+    total_credits = np.bincount(student_idx, weights=credits, minlength=n_students)
+    total_weighted = np.bincount(student_idx, weights=weighted, minlength=n_students)
+
+    sgpa = np.divide(cell_weighted, cell_credits, out=np.zeros(cell_credits.shape), where=cell_credits != 0)
+    cgpa = np.divide(total_weighted, total_credits, out=np.zeros(total_credits.shape), where=total_credits != 0)
+    taken = np.bincount(arrays['student_idx'] * n_sems + arrays['sem_idx'], minlength=n_students * n_sems)
+    return {
+        'sgpa': sgpa,
+        'semester_credits': cell_credits,
+        'taken': taken.reshape(n_students, n_sems) > 0,
+        'cgpa': cgpa,
+        'total_credits': total_credits
+    }
+
+def compute_cohort_gpa(records):
+    """Per-student SGPA by semester and CGPA, matching calculate_sgpa() on each student's rows"""
+    arrays = load_cohort_arrays(records)
+    gpa = cohort_gpa_arrays(arrays)
+    cohort = {}
+    for i, reg_no in enumerate(arrays['students']):
+        cohort[reg_no] = {
+            'sgpa': {
+                sem: float(gpa['sgpa'][i, j])
+                for j, sem in enumerate(arrays['semesters']) if gpa['taken'][i, j]
+            },
+            'cgpa': float(gpa['cgpa'][i]),
+            'total_credits': float(gpa['total_credits'][i])
+        }
+    return cohort
+
+def fetch_cohort_gpa(query):
+    """Load a cohort's CUTM1 rows and compute every student's SGPA/CGPA in one pass"""
+    cursor = cutm_collection.find(query, COHORT_PROJECTION).batch_size(EXPORT_BATCH_SIZE)
+    return compute_cohort_gpa(cursor)
+
+# ---------------- Migrations ----------------
+def migrate_name_keys():
+    """Store the normalized Name_Key on rows ingested before it existed"""
+    result = cutm_collection.update_many(
+        {"Name_Key": {"$exists": False}},
+        [{"$set": {"Name_Key": {"$substrCP": [
+            {"$toLower": {"$trim": {"input": {"$ifNull": ["$Name", ""]}}}}, 0, NAME_KEY_MAX_LENGTH
+        ]}}}]
+    )
+    return result.modified_count
+
+MIGRATION_BATCH_SIZE = 1000
+
+def backfill_numeric_fields(collection, query, with_grade):
+    """Store Credits_Total / Credits_Parts (and Grade_Point) on matching rows"""
+    operations = []
+    modified = 0
+    for row in collection.find(query, {"Credits": 1, "Grade": 1}):
+        grade = row.get("Grade", "") if with_grade else None
+        operations.append(UpdateOne({"_id": row["_id"]}, {"$set": numeric_fields(row.get("Credits"), grade)}))
+        if len(operations) >= MIGRATION_BATCH_SIZE:
+            modified += collection.bulk_write(operations, ordered=False).modified_count
+            operations = []
+    if operations:
+        modified += collection.bulk_write(operations, ordered=False).modified_count
+    return modified
+
+def migrate_result_numeric_fields():
+    """Precompute numeric credits and grade points on existing CUTM1 rows"""
+    query = {"$or": [{"Credits_Total": {"$exists": False}}, {"Grade_Point": {"$exists": False}}]}
+    return backfill_numeric_fields(cutm_collection, query, with_grade=True)
+
+def migrate_cbcs_numeric_fields():
+    """Precompute numeric credits on existing CBCS subjects"""
+    return backfill_numeric_fields(cbcs_collection, {"Credits_Total": {"$exists": False}}, with_grade=False)
+
+def migrate_derived_result_fields():
+    """Store Branch_Code, Batch_Year and Sem_No on existing CUTM1 rows"""
+    operations = []
+    modified = 0
+    for row in cutm_collection.find({"Branch_Code": {"$exists": False}}, {"Reg_No": 1, "Sem": 1}):
+        fields = derived_result_fields(row.get("Reg_No", ""), row.get("Sem"))
+        operations.append(UpdateOne({"_id": row["_id"]}, {"$set": fields}))
+        if len(operations) >= MIGRATION_BATCH_SIZE:
+            modified += cutm_collection.bulk_write(operations, ordered=False).modified_count
+            operations = []
+    if operations:
+        modified += cutm_collection.bulk_write(operations, ordered=False).modified_count
+    return modified
+
+def migrate_cbcs_branch_tokens():
+    """Store normalized Branch_Tokens on CBCS subjects, rewriting any left by an older tokenizer"""
+    operations = []
+    modified = 0
+    for subject in cbcs_collection.find({}, {"Branch": 1, "Branch_Tokens": 1}):
+        tokens = branch_tokens(subject.get("Branch"))
+        if subject.get("Branch_Tokens") == tokens:
+            continue
+        operations.append(UpdateOne({"_id": subject["_id"]}, {"$set": {"Branch_Tokens": tokens}}))
+        if len(operations) >= MIGRATION_BATCH_SIZE:
+            modified += cbcs_collection.bulk_write(operations, ordered=False).modified_count
+            operations = []
+    if operations:
+        modified += cbcs_collection.bulk_write(operations, ordered=False).modified_count
+    if modified:
+        bump_cbcs_catalogue_version()
+    return modified
+
+SUPERSEDED_CUTM_INDEXES = [
+    "Name_1",                                     # name lookups go through Name_Key
+    "Batch_Year_1_Branch_Code_1_Reg_No_1_Sem_1",  # extended with Subject_Code for keyset paging
+    "Branch_Code_1_Reg_No_1"                      # replaced by Branch_Code, Reg_No, Sem, Subject_Code
+]
+
+def drop_superseded_indexes():
+    """Drop CUTM1 indexes no query uses any more; each one only slows writes"""
+    existing = cutm_collection.index_information()
+    dropped = 0
+    for name in SUPERSEDED_CUTM_INDEXES:
+        if name in existing:
+            cutm_collection.drop_index(name)
+            dropped += 1
+    return dropped
+
+MIGRATIONS = [
+    drop_superseded_indexes,
+    migrate_name_keys,
+    migrate_result_numeric_fields,
+    migrate_cbcs_numeric_fields,
+    migrate_derived_result_fields,
+    migrate_cbcs_branch_tokens,
+]
+
+@app.cli.command('migrate')
+def migrate_command():
+    """Backfill derived fields on existing CUTM1/CBCS rows"""
+    for migration in MIGRATIONS:
+        modified = migration()
+        print(f"{migration.__name__}: {modified} documents updated")
+
+# ---------------- Semester Catalogue ----------------
+SEMESTER_CATALOGUE_VERSION_ID = 'semesters'
+_semester_cache = {'entry': None}
+
+def get_semester_catalogue_version():
+    """Current version of the semester list, bumped when ingestion adds a semester"""
+    doc = cache_versions_collection.find_one({"_id": SEMESTER_CATALOGUE_VERSION_ID}, {"Version": 1})
+    return doc.get("Version", 0) if doc else 0
+
+def get_all_semesters():
+    """Return the sorted list of all semesters, cached until the semester version changes"""
+    version = get_semester_catalogue_version()
+    entry = _semester_cache['entry']
+    if entry is None or entry['version'] != version:
+        entry = {'version': version, 'semesters': sorted(sem for sem in cutm_collection.distinct("Sem") if sem)}
+        _semester_cache['entry'] = entry
+    return entry['semesters']
+
+def invalidate_semesters(new_semesters=None):
+    """Invalidate the semester list in every worker if ingestion added an unknown semester"""
+    if new_semesters is not None and not any(new_semesters):
+        return
+    entry = _semester_cache['entry']
+    if entry is not None and new_semesters is not None and all(not sem or sem in entry['semesters'] for sem in new_semesters):
+        return
+    cache_versions_collection.update_one(
+        {"_id": SEMESTER_CATALOGUE_VERSION_ID},
+        {"$inc": {"Version": 1}, "$set": {"Updated_At": datetime.utcnow()}},
+        upsert=True
+    )
+
+# ---------------- Student Summary ----------------
+SUMMARY_BATCH_SIZE = 500
+
+def build_student_summary(reg_no, records):
+    """Build the materialized summary document of one student"""
+    semesters = sorted({r.get("Sem") for r in records if r.get("Sem")})
+    transcript = build_transcript(records, semesters, reg_no)
+    semester_stats = [
+        {
+            "Sem": sem,
+            "SGPA": round(data['sgpa'], 2),
+            "Credits": data['total_credits'],
+            "Subjects": data['count']
+        }
+        for sem, data in transcript['semester_results'].items()
+    ]
+    name = next((r.get("Name") for r in records if r.get("Name")), "")
+    return {
+        "Reg_No": reg_no,
+        "Name": name,
+        "Branch": get_branch_from_reg_no(reg_no),
+        "Batch": get_year_from_reg_no(reg_no),
+        "Semesters": semesters,
+        "Semester_Stats": semester_stats,
+        "CGPA": round(transcript['cgpa'] or 0, 2),
+        "Total_Credits": transcript['total_all_semester_credits'],
+        "Backlog_Count": sum(1 for r in records if r.get("Grade") in BACKLOG_GRADES),
+        "Updated_At": datetime.utcnow()
+    }
+
+def summary_operation(reg_no, records):
+    """Return the bulk operation that refreshes one summary document"""
+    try:
+        summary = build_student_summary(reg_no, records)
+    except (TypeError, ValueError) as e:
+        print(f"ERROR building summary for {reg_no}: {str(e)}")
+        return DeleteOne({"Reg_No": reg_no})
+    return ReplaceOne({"Reg_No": reg_no}, summary, upsert=True)
+
+def refresh_student_summaries(reg_nos):
+    """Recompute the summary documents of the given students"""
+    reg_nos = sorted({r for r in reg_nos if r})
+    refreshed = 0
+    for start in range(0, len(reg_nos), SUMMARY_BATCH_SIZE):
+        chunk = reg_nos[start:start + SUMMARY_BATCH_SIZE]
+        records_by_reg = {reg_no: [] for reg_no in chunk}
+        for row in cutm_collection.find({"Reg_No": {"$in": chunk}}, TRANSCRIPT_PROJECTION):
+            records_by_reg[row["Reg_No"]].append(row)
+
+        operations = []
+        for reg_no, records in records_by_reg.items():
+            if records:
+                operations.append(summary_operation(reg_no, records))
+            else:
+                operations.append(DeleteOne({"Reg_No": reg_no}))
+        student_summary_collection.bulk_write(operations, ordered=False)
+        refreshed += len(operations)
+    return refreshed
+
+def rebuild_all_student_summaries():
+    """Recompute every summary document from CUTM1 (initial backfill)"""
+    started = datetime.utcnow()
+    cursor = cutm_collection.find({"Reg_No": {"$ne": ""}}, TRANSCRIPT_PROJECTION).sort([("Reg_No", 1)])
+    operations = []
+    rebuilt = 0
+    for reg_no, records in groupby(cursor, key=lambda r: r.get("Reg_No")):
+        if not reg_no:
+            continue
+        operations.append(summary_operation(reg_no, list(records)))
+        if len(operations) >= SUMMARY_BATCH_SIZE:
+            student_summary_collection.bulk_write(operations, ordered=False)
+            rebuilt += len(operations)
+            operations = []
+    if operations:
+        student_summary_collection.bulk_write(operations, ordered=False)
+        rebuilt += len(operations)
+    student_summary_collection.delete_many({"Updated_At": {"$lt": started}})
+    refresh_cohort_ranks(student_summary_collection.distinct("Reg_No"))
+    return rebuilt
+
+def get_student_summary(registration):
+    """Fetch the materialized summary of a student, if present"""
+    if not registration:
+        return None
+    return student_summary_collection.find_one({"Reg_No": registration}, {"_id": 0})
+
+def get_cohort_summaries(batch=None, branch=None):
+    """One summary row per student of a batch and/or branch, ordered by registration"""
+    query = {}
+    if batch:
+        query["Batch"] = batch
+    if branch:
+        query["Branch"] = branch
+    projection = {"_id": 0, "Reg_No": 1, "Name": 1, "Branch": 1, "Batch": 1, "Semesters": 1,
+                  "Semester_Stats": 1, "CGPA": 1, "Total_Credits": 1, "Backlog_Count": 1}
+    return list(student_summary_collection.find(query, projection).sort([("Reg_No", 1)]))
+
+@app.cli.command('rebuild-summaries')
+def rebuild_summaries_command():
+    """Backfill the student_summary collection from CUTM1"""
+    rebuilt = rebuild_all_student_summaries()
+    print(f"Rebuilt {rebuilt} student summaries")
+
+# ---------------- Cohort Rankings ----------------
+RANKING_SCOPE_OVERALL = 'overall'
+_cohort_rankings = {}
+_cohort_rankings_lock = threading.Lock()
+
+def get_cohort_key(reg_no):
+    """(Batch_Year, Branch_Code) cohort a registration number belongs to"""
+    return get_year_from_reg_no(reg_no), get_branch_code_from_reg_no(reg_no)
+
+def bump_cohort_versions(reg_nos):
+    """Mark the cohorts of the given students as changed so their rankings rebuild"""
+    cohorts = {get_cohort_key(reg_no) for reg_no in reg_nos if reg_no}
+    if not cohorts:
+        return
+    cohort_versions_collection.bulk_write([
+        UpdateOne({"Batch_Year": batch_year, "Branch_Code": branch_code},
+                  {"$inc": {"Version": 1}, "$set": {"Updated_At": datetime.utcnow()}}, upsert=True)
+        for batch_year, branch_code in cohorts
+    ], ordered=False)
+
+def get_cohort_version(batch_year, branch_code):
+    """Current data version of a cohort (0 if never bumped)"""
+    doc = cohort_versions_collection.find_one({"Batch_Year": batch_year, "Branch_Code": branch_code}, {"_id": 0, "Version": 1})
+    return doc.get("Version", 0) if doc else 0
+
+def build_ranking_scope(values_by_reg):
+    """Sorted GPA values for bisecting plus the descending leaderboard of one scope"""
+    return {
+        'by_reg': values_by_reg,
+        'values': sorted(values_by_reg.values()),
+        'ranked': sorted(values_by_reg.items(), key=lambda item: (-item[1], item[0]))
+    }
+
+def build_cohort_rankings(batch_year, branch_code):
+    """Compute overall (CGPA) and per-semester (SGPA) ranking scopes of a cohort"""
+    cohort = fetch_cohort_gpa({"Batch_Year": batch_year, "Branch_Code": branch_code})
+    by_semester = {}
+    for reg_no, gpa in cohort.items():
+        for sem, sgpa in gpa['sgpa'].items():
+            by_semester.setdefault(sem, {})[reg_no] = sgpa
+
+    scopes = {RANKING_SCOPE_OVERALL: build_ranking_scope({reg_no: gpa['cgpa'] for reg_no, gpa in cohort.items()})}
+    for sem, values in by_semester.items():
+        scopes[sem] = build_ranking_scope(values)
+    return scopes
+
+def get_cohort_rankings(batch_year, branch_code):
+    """Ranking scopes of a cohort, rebuilt lazily (one builder per worker) when its data version changes"""
+    key = (batch_year, branch_code)
+    version = get_cohort_version(batch_year, branch_code)
+    cached = _cohort_rankings.get(key)
+    if cached is None or cached['version'] != version:
+        with _cohort_rankings_lock:
+            cached = _cohort_rankings.get(key)
+            if cached is None or cached['version'] != version:
+                cached = {'version': version, 'scopes': build_cohort_rankings(batch_year, branch_code)}
+                _cohort_rankings[key] = cached
+    return cached['scopes']
+
+def scope_rank_fields(scope_name, scope):
+    """Stored rank fields of every student in one ranking scope"""
+    values = scope['values']
+    fields = {}
+    for reg_no, value in scope['by_reg'].items():
+        at_or_below = bisect_right(values, value)
+        fields[reg_no] = {
+            "Scope": scope_name,
+            "GPA": round(value, 2),
+            "Rank": len(values) - at_or_below + 1,
+            "Cohort_Size": len(values),
+            "Percentile": round(at_or_below / len(values) * 100, 2)
+        }
+    return fields
+
+def refresh_cohort_ranks(reg_nos):
+    """Recompute the rankings of the given students' cohorts and store each student's ranks on their summary"""
+    cohorts = {get_cohort_key(reg_no) for reg_no in reg_nos if reg_no}
+    for batch_year, branch_code in sorted(cohorts):
+        try:
+            version = get_cohort_version(batch_year, branch_code)
+            scopes = build_cohort_rankings(batch_year, branch_code)
+            _cohort_rankings[(batch_year, branch_code)] = {'version': version, 'scopes': scopes}
+
+            ranks = {}
+            for scope_name, scope in scopes.items():
+                for reg_no, fields in scope_rank_fields(scope_name, scope).items():
+                    ranks.setdefault(reg_no, []).append(fields)
+            operations = [UpdateOne({"Reg_No": reg_no}, {"$set": {"Ranks": student_ranks}})
+                          for reg_no, student_ranks in ranks.items()]
+            for start in range(0, len(operations), SUMMARY_BATCH_SIZE):
+                student_summary_collection.bulk_write(operations[start:start + SUMMARY_BATCH_SIZE], ordered=False)
+        except Exception as e:
+            print(f"ERROR ranking cohort {batch_year}/{branch_code}: {str(e)}")
+
+def summary_rank(summary, semester=None):
+    """Stored rank of a student for a semester (or overall), or None when not ranked"""
+    if not summary:
+        return None
+    scope_name = semester or RANKING_SCOPE_OVERALL
+    fields = next((r for r in summary.get("Ranks") or [] if r.get("Scope") == scope_name), None)
+    if not fields:
+        return None
+    batch_year, branch_code = get_cohort_key(summary["Reg_No"])
+    return {
+        'reg_no': summary["Reg_No"],
+        'batch_year': batch_year,
+        'branch': get_branch_short_from_code(branch_code),
+        'scope': scope_name,
+        'gpa': fields["GPA"],
+        'rank': fields["Rank"],
+        'cohort_size': fields["Cohort_Size"],
+        'percentile': fields["Percentile"]
+    }
+
+def get_student_rank(reg_no, semester=None):
+    """Rank and percentile of a student within their batch and branch"""
+    if not reg_no:
+        return None
+    return summary_rank(get_student_summary(reg_no), semester)
+
+def get_cohort_top(batch_year, branch_code, semester=None, limit=10):
+    """Top students of a cohort scope, best GPA first"""
+    scope = get_cohort_rankings(batch_year, branch_code).get(semester or RANKING_SCOPE_OVERALL)
+    if not scope:
+        return []
+    values = scope['values']
+    return [
+        {'reg_no': reg_no, 'gpa': round(value, 2), 'rank': len(values) - bisect_right(values, value) + 1}
+        for reg_no, value in scope['ranked'][:limit]
+    ]
+
+@app.route('/rank/<reg_no>')
+def student_rank(reg_no):
+    rank = get_student_rank(reg_no.strip().upper(), request.args.get('semester'))
+    if not rank:
+        return jsonify({'error': 'No ranking found for this registration'}), 404
+    return jsonify(rank)
+
+@app.route('/rankings')
+def cohort_rankings():
+    batch = (request.args.get('batch') or "").strip()
+    branch_code = BACKLOG_BRANCH_INPUTS.get((request.args.get('branch') or "").strip().lower())
+    if not (batch.isdigit() and len(batch) in (2, 4)) or not branch_code:
+        return jsonify({'error': 'Provide a batch (e.g. 2021) and a branch (Civil, CSE, ECE, EEE, Mechanical)'}), 400
+
+    batch_year = f"20{batch[-2:]}"
+    semester = request.args.get('semester')
+    limit = max(1, min(request.args.get('top', 10, type=int) or 10, MAX_PAGE_SIZE))
+    return jsonify({
+        'batch_year': batch_year,
+        'branch': get_branch_short_from_code(branch_code),
+        'scope': semester or RANKING_SCOPE_OVERALL,
+        'top': get_cohort_top(batch_year, branch_code, semester, limit)
+    })
+
 # ---------------- Home Route ----------------
 @app.route('/', methods=['GET', 'POST'])
 def home():
     try:
-        semesters = sorted({doc["Sem"] for doc in cutm_collection.find({}, {"Sem": 1, "_id": 0})})
+        semesters = get_all_semesters()
         
         results, count, message = [], 0, None
         semester_results = {}
@@ -2204,58 +2864,24 @@ def home():
             if not selected_semesters:
                 return render_template('index.html', semesters=semesters, error="Please select at least one semester.")
 
-            total_count = 0
-            for semester in selected_semesters:
-                semester = str(semester).strip()
-                
-                query = {
-                    "$and": [
-                        {"$or": [
-                            {"Reg_No": registration}, 
-                            {"Name": {"$regex": f"^{name}$", "$options": "i"}}
-                        ]}, 
-                        {"Sem": semester}
-                    ]
-                }
-                projection = {
-                    "_id": 0, "Credits": 1, "Grade": 1, "Subject_Name": 1, 
-                    "Subject_Code": 1, "Sem": 1, "Name": 1, "Reg_No": 1
-                }
-                
-                semester_data = list(cutm_collection.find(query, projection))
-                
-                if semester_data:
-                    sgpa, total_credits = calculate_sgpa(semester_data)
-                    
-                    semester_results[semester] = {
-                        'data': semester_data,
-                        'count': len(semester_data),
-                        'sgpa': sgpa,
-                        'total_credits': total_credits
-                    }
-                    
-                    results.extend(semester_data)
-                    total_count += len(semester_data)
-
-            count = total_count
-
-            if registration:
-                all_credits = cutm_collection.find({"Reg_No": registration}, {"Credits": 1, "_id": 0})
-                for row in all_credits:
-                    credits_str = row.get("Credits") or ""
-                    parts = [p for p in str(credits_str).split('+') if p.strip() != ""]
-                    if not parts:
-                        continue
-                    try:
-                        total_all_semester_credits += sum(float(part) for part in parts)
-                    except ValueError:
-                        continue
-
-                overall_cgpa = calculate_cgpa(registration, name)
+            summary = get_student_summary(registration) if not name else None
+            if summary:
+                records = fetch_transcript(registration, name, selected_semesters)
+                transcript = build_transcript(records, selected_semesters, None)
+                transcript['cgpa'] = summary.get('CGPA')
+                transcript['total_all_semester_credits'] = summary.get('Total_Credits', 0)
+            else:
+                transcript = build_transcript(fetch_transcript(registration, name), selected_semesters, registration)
+            results = transcript['results']
+            semester_results = transcript['semester_results']
+            count = transcript['count']
+            overall_cgpa = transcript['cgpa']
+            total_all_semester_credits = transcript['total_all_semester_credits']
 
             if count == 0:
                 message = "No records found for the selected criteria."
 
+            overall_rank = summary_rank(summary) if count else None
             current_date = datetime.now().strftime('%d-%b-%Y')
 
             if len(selected_semesters) == 1:
@@ -2271,6 +2897,8 @@ def home():
                         total_credits=sem_data['total_credits'],
                         cgpa=overall_cgpa,
                         total_all_semester_credits=total_all_semester_credits,
+                        semester_rank=summary_rank(summary, semester) if overall_rank else None,
+                        overall_rank=overall_rank,
                         message=message,
                         selected_semester=semester,
                         semesters=semesters,
@@ -2289,6 +2917,7 @@ def home():
                     count=count,
                     cgpa=overall_cgpa,
                     total_all_semester_credits=total_all_semester_credits,
+                    overall_rank=overall_rank,
                     message=message,
                     semesters=semesters,
                     registration=registration,
@@ -2310,6 +2939,9 @@ def get_semesters_for_student():
         registration = (request.form.get('registration') or "").strip().upper()
         if not registration:
             return jsonify(semesters=[])
+        summary = get_student_summary(registration)
+        if summary:
+            return jsonify(semesters=summary.get("Semesters", []))
         semesters = sorted({doc["Sem"] for doc in cutm_collection.find({"Reg_No": registration}, {"Sem": 1, "_id": 0})})
         return jsonify(semesters=semesters)
     except Exception as e:
@@ -2317,10 +2949,377 @@ def get_semesters_for_student():
 
 # ---------------- Update Data ----------------
 ALLOWED_EXTENSIONS = {'csv', 'xls', 'xlsx'}
+INGEST_BATCH_SIZE = 1000
+INGEST_CHUNK_ROWS = 5000
+UPLOAD_COPY_BUFFER = 1024 * 1024
+OVERWRITABLE_GRADES = {'F', 'S', 'M', 'I', 'R', ''}
 
 def allowed_file(filename):
     return '.' in filename and filename.rsplit('.', 1)[1].lower() in ALLOWED_EXTENSIONS
 
+def new_ingest_stats():
+    """Counters shared by every chunk written during one upload"""
+    return {'parsed': 0, 'rejected': 0, 'updated': 0, 'inserted': 0, 'reg_nos': set(), 'semesters': set()}
+
+def normalize_result_frame(df, stats=None):
+    """Turn an uploaded result sheet into normalized result records"""
+    cols = {c.lower().strip(): c for c in df.columns}
+    def col(*names):
+        for n in names:
+            if n.lower() in cols:
+                return cols[n.lower()]
+        return None
+
+    col_reg = col('Reg_No', 'Registration No.')
+    col_code = col('Subject_Code', 'Subject Code')
+    col_sname = col('Subject_Name', 'Subject Name')
+    col_name = col('Name')
+    col_sem = col('Sem')
+    col_credits = col('Credits', 'Credit')
+    col_grade = col('Grade', 'Grade Point')
+    col_stype = col('Subject_Type', 'Subject Type')
+
+    def text(column, upper=False):
+        if not column:
+            return pd.Series("", index=df.index, dtype=object)
+        values = df[column].fillna("").astype(str).str.strip()
+        return values.str.upper() if upper else values
+
+    frame = pd.DataFrame({
+        "Reg_No": text(col_reg, upper=True),
+        "Subject_Code": text(col_code, upper=True),
+        "Grade": text(col_grade, upper=True),
+        "Name": text(col_name),
+        "Sem": text(col_sem),
+        "Subject_Name": text(col_sname),
+        "Subject_Type": text(col_stype),
+        "Credits": text(col_credits)
+    })
+    frame = frame[(frame["Reg_No"] != "") & (frame["Subject_Code"] != "")].copy()
+    if stats is not None:
+        stats['parsed'] += len(df)
+        stats['rejected'] += len(df) - len(frame)
+    numeric_sem = frame["Sem"].str.isdigit()
+    frame.loc[numeric_sem, "Sem"] = "Sem " + frame.loc[numeric_sem, "Sem"]
+
+    # Collapse repeated pairs the way sequential writes would: the first
+    # non-overwritable grade sticks, otherwise the last grade in the file wins
+    keys = ["Reg_No", "Subject_Code"]
+    firm_grades = frame[~frame["Grade"].isin(OVERWRITABLE_GRADES)].drop_duplicates(keys, keep="first")
+    last_grades = frame.drop_duplicates(keys, keep="last")
+    grades = pd.concat([firm_grades, last_grades]).drop_duplicates(keys, keep="first")[keys + ["Grade"]]
+    frame = frame.drop_duplicates(keys, keep="first").drop(columns="Grade").merge(grades, on=keys, how="left")
+    return frame.to_dict("records")
+
+def build_result_document(record):
+    """Full CUTM1 document for a newly ingested result row"""
+    return {
+        "Reg_No": record["Reg_No"],
+        "Subject_Code": record["Subject_Code"],
+        "Grade": record["Grade"],
+        "Name": record["Name"],
+        "Name_Key": normalize_name(record["Name"]),
+        "Sem": record["Sem"],
+        "Subject_Name": record["Subject_Name"],
+        "Subject_Type": record["Subject_Type"],
+        "Credits": record["Credits"],
+        **numeric_fields(record["Credits"], record["Grade"]),
+        **derived_result_fields(record["Reg_No"], record["Sem"])
+    }
+
+def write_result_records(records, stats):
+    """Write normalized records with one prefetch and one bulk_write per chunk"""
+    for start in range(0, len(records), INGEST_BATCH_SIZE):
+        chunk = records[start:start + INGEST_BATCH_SIZE]
+
+        existing = {}
+        cursor = cutm_collection.find(
+            {"Reg_No": {"$in": list({r["Reg_No"] for r in chunk})},
+             "Subject_Code": {"$in": list({r["Subject_Code"] for r in chunk})}},
+            {"_id": 0, "Reg_No": 1, "Subject_Code": 1, "Grade": 1}
+        )
+        for row in cursor:
+            existing.setdefault((row["Reg_No"], row["Subject_Code"]), row.get("Grade"))
+
+        # Only backlog/blank grades may be overwritten; unknown pairs are inserted
+        inserts, updates = {}, {}
+        for record in chunk:
+            key = (record["Reg_No"], record["Subject_Code"])
+            if key in inserts:
+                if inserts[key]["Grade"] in OVERWRITABLE_GRADES:
+                    inserts[key]["Grade"] = record["Grade"]
+                    inserts[key]["Grade_Point"] = grade_point(record["Grade"])
+                    stats['updated'] += 1
+            elif key in existing:
+                if updates.get(key, existing[key]) in OVERWRITABLE_GRADES:
+                    updates[key] = record["Grade"]
+                    stats['updated'] += 1
+                    stats['reg_nos'].add(record["Reg_No"])
+            else:
+                inserts[key] = build_result_document(record)
+                stats['inserted'] += 1
+                stats['reg_nos'].add(record["Reg_No"])
+                stats['semesters'].add(record["Sem"])
+
+        operations = [
+            UpdateOne(
+                {"Reg_No": reg_no, "Subject_Code": subject_code},
+                {"$set": {"Grade": grade, "Grade_Point": grade_point(grade)}}
+            )
+            for (reg_no, subject_code), grade in updates.items()
+        ]
+        operations.extend(
+            UpdateOne(
+                {"Reg_No": reg_no, "Subject_Code": subject_code},
+                {"$setOnInsert": document},
+                upsert=True
+            )
+            for (reg_no, subject_code), document in inserts.items()
+        )
+        if operations:
+            cutm_collection.bulk_write(operations, ordered=False)
+    return stats
+
+def spool_upload(file):
+    """Copy an uploaded file to a temporary file on disk and return its path"""
+    suffix = '.' + file.filename.rsplit('.', 1)[1].lower()
+    handle, path = tempfile.mkstemp(prefix='cutm_upload_', suffix=suffix)
+    with os.fdopen(handle, 'wb') as out:
+        shutil.copyfileobj(file.stream, out, UPLOAD_COPY_BUFFER)
+    return path
+
+def excel_cell_text(value):
+    """Render an openpyxl cell value the way pd.read_excel(dtype=str) would"""
+    if value is None:
+        return None
+    if isinstance(value, float) and value.is_integer():
+        value = int(value)
+    return str(value)
+
+def iter_excel_chunks(path, chunk_rows):
+    """Stream the first .xlsx sheet through openpyxl's read-only reader in DataFrame chunks"""
+    workbook = load_workbook(path, read_only=True, data_only=True)
+    try:
+        # The first sheet, like pd.read_excel; the active sheet is whichever was open when the file was saved
+        rows = workbook.worksheets[0].iter_rows(values_only=True)
+        header = next(rows, None)
+        if header is None:
+            return
+        columns = [str(c).strip() if c is not None else f"Unnamed: {i}" for i, c in enumerate(header)]
+        width = len(columns)
+        batch = []
+        for values in rows:
+            values = list(values[:width]) + [None] * (width - len(values))
+            batch.append([excel_cell_text(v) for v in values])
+            if len(batch) >= chunk_rows:
+                yield pd.DataFrame(batch, columns=columns, dtype=object)
+                batch = []
+        if batch:
+            yield pd.DataFrame(batch, columns=columns, dtype=object)
+    finally:
+        workbook.close()
+
+def iter_upload_chunks(path, chunk_rows=INGEST_CHUNK_ROWS):
+    """Yield the rows of a spooled result sheet as DataFrame chunks"""
+    extension = os.path.splitext(path)[1].lower().lstrip('.')
+    if extension == 'csv':
+        yield from pd.read_csv(path, dtype=str, chunksize=chunk_rows)
+    elif extension == 'xlsx':
+        yield from iter_excel_chunks(path, chunk_rows)
+    else:
+        # Legacy .xls has no streaming reader; slice it after loading
+        df = pd.read_excel(path, dtype=str)
+        for start in range(0, len(df), chunk_rows):
+            yield df.iloc[start:start + chunk_rows]
+
+def parse_result_file(path):
+    """Parse and normalize one spooled sheet into a temporary file of record batches"""
+    started = time.time()
+    stats = new_ingest_stats()
+    handle, batch_path = tempfile.mkstemp(prefix='cutm_records_', suffix='.pkl')
+    try:
+        with os.fdopen(handle, 'wb') as out:
+            for chunk in iter_upload_chunks(path):
+                pickle.dump(normalize_result_frame(chunk, stats), out, pickle.HIGHEST_PROTOCOL)
+    except Exception:
+        os.remove(batch_path)
+        raise
+    return {
+        'batch_path': batch_path,
+        'parsed': stats['parsed'],
+        'rejected': stats['rejected'],
+        'parse_seconds': round(time.time() - started, 2)
+    }
+
+def iter_record_batches(batch_path):
+    """Read back the record batches written by parse_result_file()"""
+    with open(batch_path, 'rb') as batches:
+        while True:
+            try:
+                yield pickle.load(batches)
+            except EOFError:
+                return
+
+def finish_ingest(stats):
+    """Refresh derived data once every file of an upload has been written"""
+    refresh_student_summaries(stats['reg_nos'])
+    bump_cohort_versions(stats['reg_nos'])
+    refresh_cohort_ranks(stats['reg_nos'])
+    invalidate_semesters(stats['semesters'])
+
+# ---------------- Background Ingestion Jobs ----------------
+INGEST_WORKERS = int(os.getenv('INGEST_WORKERS', 2))
+ingest_executor = ThreadPoolExecutor(max_workers=INGEST_WORKERS, thread_name_prefix='ingest')
+
+def ingest_progress(stats, started):
+    """Progress counters and throughput reported for an ingestion job"""
+    elapsed = time.time() - started
+    return {
+        'rows_parsed': stats['parsed'],
+        'rows_inserted': stats['inserted'],
+        'rows_updated': stats['updated'],
+        'rows_rejected': stats['rejected'],
+        'elapsed_seconds': round(elapsed, 2),
+        'rows_per_second': round(stats['parsed'] / elapsed, 1) if elapsed > 0 else 0
+    }
+
+MAX_PARSE_WORKERS = 4
+PARSE_WORKERS = max(1, min(int(os.getenv('PARSE_WORKERS', os.cpu_count() or 1)), MAX_PARSE_WORKERS))
+_parse_pool = None
+_parse_pool_lock = threading.Lock()
+
+def get_parse_pool():
+    """Process pool that parses uploaded files, one file per worker"""
+    global _parse_pool
+    with _parse_pool_lock:
+        if _parse_pool is None:
+            # Spawned, not forked: the app process holds a live MongoClient and executor threads
+            _parse_pool = ProcessPoolExecutor(max_workers=PARSE_WORKERS, mp_context=multiprocessing.get_context('spawn'))
+    return _parse_pool
+
+def shutdown_parse_pool():
+    """Stop the parse workers when the app process exits"""
+    global _parse_pool
+    with _parse_pool_lock:
+        if _parse_pool is not None:
+            _parse_pool.shutdown(wait=False, cancel_futures=True)
+            _parse_pool = None
+
+atexit.register(shutdown_parse_pool)
+
+def iter_parsed_files(uploads):
+    """Parse uploads in parallel, yielding results in upload order"""
+    if len(uploads) == 1 or PARSE_WORKERS < 2:
+        for path, _ in uploads:
+            yield parse_result_file(path)
+        return
+    pending = [get_parse_pool().submit(parse_result_file, path) for path, _ in uploads]
+    try:
+        while pending:
+            yield pending.pop(0).result()
+    finally:
+        # Closed early (a file failed): nobody will consume the remaining parses
+        discard_parsed_files(pending)
+
+def discard_parsed_files(futures):
+    """Cancel queued parses and delete the record files of any that already ran"""
+    for future in futures:
+        if future.cancel():
+            continue
+        try:
+            batch_path = future.result()['batch_path']
+        except Exception:
+            continue
+        if os.path.exists(batch_path):
+            os.remove(batch_path)
+
+def update_ingest_job(job_id, fields):
+    """Record progress fields on a job document"""
+    ingest_jobs_collection.update_one({'_id': job_id}, {'$set': fields})
+
+def run_ingest_job(job_id, uploads):
+    """Ingest spooled uploads in the background, recording progress as it goes"""
+    started = time.time()
+    stats = new_ingest_stats()
+    file_timings = []
+    batch_paths = []
+    error, parsed_files = None, None
+    update_ingest_job(job_id, {'status': 'running', 'started_at': datetime.utcnow()})
+    try:
+        # Files are parsed concurrently but written in upload order, so later
+        # files still see the grades written by earlier ones
+        parsed_files = iter_parsed_files(uploads)
+        for (path, filename), parsed in zip(uploads, parsed_files):
+            batch_paths.append(parsed['batch_path'])
+            stats['parsed'] += parsed['parsed']
+            stats['rejected'] += parsed['rejected']
+            update_ingest_job(job_id, {'current_file': filename, **ingest_progress(stats, started)})
+
+            write_started = time.time()
+            for records in iter_record_batches(parsed['batch_path']):
+                write_result_records(records, stats)
+                update_ingest_job(job_id, ingest_progress(stats, started))
+            file_timings.append({
+                'file': filename,
+                'rows': parsed['parsed'],
+                'parse_seconds': parsed['parse_seconds'],
+                'write_seconds': round(time.time() - write_started, 2)
+            })
+            update_ingest_job(job_id, {'file_timings': file_timings})
+    except Exception as e:
+        print(f"ERROR in ingest job {job_id}: {str(e)}")
+        error = e
+    finally:
+        # Rows written before a failure are in CUTM1 too; refresh whatever they touched
+        try:
+            finish_ingest(stats)
+        except Exception as e:
+            print(f"ERROR refreshing derived data for ingest job {job_id}: {str(e)}")
+            error = error or e
+        # Stop or drain the parse workers before their spooled uploads are deleted
+        if parsed_files is not None:
+            parsed_files.close()
+        for path in [path for path, _ in uploads] + batch_paths:
+            if os.path.exists(path):
+                os.remove(path)
+
+    if error is None:
+        update_ingest_job(job_id, {
+            **ingest_progress(stats, started),
+            'status': 'completed',
+            'current_file': None,
+            'finished_at': datetime.utcnow(),
+            'message': f"All files processed successfully! Updated: {stats['updated']}, Inserted: {stats['inserted']}"
+        })
+    else:
+        update_ingest_job(job_id, {
+            **ingest_progress(stats, started),
+            'status': 'failed',
+            'finished_at': datetime.utcnow(),
+            'error': str(error)
+        })
+
+def submit_ingest_job(uploads):
+    """Queue spooled uploads for background ingestion and return the job id"""
+    job_id = uuid.uuid4().hex
+    ingest_jobs_collection.insert_one({
+        '_id': job_id,
+        'status': 'queued',
+        'files': [filename for _, filename in uploads],
+        'created_at': datetime.utcnow(),
+        **ingest_progress(new_ingest_stats(), time.time())
+    })
+    ingest_executor.submit(run_ingest_job, job_id, uploads)
+    return job_id
+
+def serialize_ingest_job(job):
+    """Shape a job document for the JSON status endpoints"""
+    job['id'] = job.pop('_id')
+    for field in ('created_at', 'started_at', 'finished_at'):
+        if job.get(field):
+            job[field] = convert_to_ist(job[field])
+    return job
+
 @app.route('/update_data', methods=['GET', 'POST'])
 def update_data():
     if request.method == 'POST':
@@ -2331,81 +3330,300 @@ def update_data():
         if not files or all(f.filename == '' for f in files):
             return render_template('update_data.html', error="No selected files")
 
-        updated_count = 0
-        inserted_count = 0
-
+        uploads = []
         for file in files:
             if not (file and allowed_file(file.filename)):
                 continue
+            uploads.append((spool_upload(file), secure_filename(file.filename) or file.filename))
 
-            filename = secure_filename(file.filename)
-            file_data = file.read()
-            if filename.lower().endswith('.csv'):
-                df = pd.read_csv(io.BytesIO(file_data))
-            else:
-                df = pd.read_excel(io.BytesIO(file_data))
+        if not uploads:
+            return render_template('update_data.html', error="No CSV/XLS/XLSX files to process")
 
-            cols = {c.lower().strip(): c for c in df.columns}
-            def col(*names):
-                for n in names:
-                    if n.lower() in cols:
-                        return cols[n.lower()]
-                return None
+        job_id = submit_ingest_job(uploads)
+        message = f"{len(uploads)} file(s) accepted for processing. Job ID: {job_id}"
+        return render_template('update_data.html', success=message, job_id=job_id)
 
-            col_reg = col('Reg_No', 'Registration No.')
-            col_code = col('Subject_Code', 'Subject Code')
-            col_sname = col('Subject_Name', 'Subject Name')
-            col_name = col('Name')
-            col_sem = col('Sem')
-            col_credits = col('Credits', 'Credit')
-            col_grade = col('Grade', 'Grade Point')
-            col_stype = col('Subject_Type', 'Subject Type')
-
-            for _, row in df.iterrows():
-                reg_no = str(row.get(col_reg) or "").strip().upper() if col_reg else ""
-                subject_code = str(row.get(col_code) or "").strip().upper() if col_code else ""
-                if not reg_no or not subject_code:
-                    continue
-
-                subject_name = str(row.get(col_sname) or "").strip() if col_sname else ""
-                name = str(row.get(col_name) or "").strip() if col_name else ""
-                sem = str(row.get(col_sem) or "").strip() if col_sem else ""
-                credits = str(row.get(col_credits) or "").strip() if col_credits else ""
-                grade = str(row.get(col_grade) or "").strip().upper() if col_grade else ""
-                subject_type = str(row.get(col_stype) or "").strip() if col_stype else ""
-                sem_value = f"Sem {sem}" if sem.isdigit() else sem
-
-                existing_record = cutm_collection.find_one(
-                    {"Reg_No": reg_no, "Subject_Code": subject_code},
-                    {"Grade": 1}
-                )
+    return render_template('update_data.html')
 
-                if existing_record:
-                    if existing_record.get("Grade") in {'F', 'S', 'M', 'I', 'R', ''}:
-                        cutm_collection.update_one(
-                            {"Reg_No": reg_no, "Subject_Code": subject_code},
-                            {"$set": {"Grade": grade}}
-                        )
-                        updated_count += 1
-                else:
-                    cutm_collection.insert_one({
-                        "Reg_No": reg_no,
-                        "Subject_Code": subject_code,
-                        "Grade": grade,
-                        "Name": name,
-                        "Sem": sem_value,
-                        "Subject_Name": subject_name,
-                        "Subject_Type": subject_type,
-                        "Credits": credits
-                    })
-                    inserted_count += 1
-
-        message = f"All files processed successfully! Updated: {updated_count}, Inserted: {inserted_count}"
-        return render_template('update_data.html', success=message)
+@app.route('/update_data/jobs')
+def list_ingest_jobs():
+    """Recent ingestion jobs, newest first"""
+    jobs = ingest_jobs_collection.find().sort([("created_at", -1)]).limit(20)
+    return jsonify(jobs=[serialize_ingest_job(job) for job in jobs])
+
+@app.route('/update_data/jobs/<job_id>')
+def ingest_job_status(job_id):
+    """Progress and final summary of one ingestion job"""
+    job = ingest_jobs_collection.find_one({'_id': job_id})
+    if not job:
+        return jsonify({'error': 'Job not found'}), 404
+    return jsonify(serialize_ingest_job(job))
+
+# ---------------- Keyset Pagination ----------------
+PAGE_SORT_FIELDS = ["Reg_No", "Sem", "Subject_Code"]
+DEFAULT_PAGE_SIZE = 100
+MAX_PAGE_SIZE = 500
+EXPORT_BATCH_SIZE = 1000
+
+def get_page_size(value):
+    """Clamp a requested page size to the supported range"""
+    try:
+        size = int(value)
+    except (TypeError, ValueError):
+        return DEFAULT_PAGE_SIZE
+    return max(1, min(size, MAX_PAGE_SIZE))
+
+def encode_page_token(row, fields=PAGE_SORT_FIELDS):
+    """Opaque cursor holding the sort key (by default Reg_No, Sem, Subject_Code) of a row"""
+    key = [str(row.get(field)) if field == "_id" else row.get(field) for field in fields]
+    return base64.urlsafe_b64encode(json.dumps(key).encode()).decode()
+
+def decode_page_token(token, fields=PAGE_SORT_FIELDS):
+    """Decode a cursor produced by encode_page_token(), or None if invalid"""
+    if not token:
+        return None
+    try:
+        key = json.loads(base64.urlsafe_b64decode(token.encode()).decode())
+    except (ValueError, TypeError):
+        return None
+    if not isinstance(key, list) or len(key) != len(fields):
+        return None
+    for i, field in enumerate(fields):
+        if field == "_id":
+            if not ObjectId.is_valid(key[i]):
+                return None
+            key[i] = ObjectId(key[i])
+    return key
+
+def keyset_condition(key, operator, fields=PAGE_SORT_FIELDS):
+    """Match rows strictly after ($gt) or before ($lt) a sort key"""
+    clauses = []
+    for i, field in enumerate(fields):
+        clause = {fields[j]: key[j] for j in range(i)}
+        clause[field] = {operator: key[i]}
+        clauses.append(clause)
+    return {"$or": clauses}
+
+def finish_keyset_page(rows, page_size, after=None, before=None, fields=PAGE_SORT_FIELDS):
+    """Trim the probe row, restore ascending order and build next/prev tokens"""
+    has_more = len(rows) > page_size
+    rows = rows[:page_size]
+    if before:
+        rows.reverse()
+        has_prev, has_next = has_more, True
+    else:
+        has_prev, has_next = after is not None, has_more
+    pagination = {
+        'page_size': page_size,
+        'next': encode_page_token(rows[-1], fields) if rows and has_next else None,
+        'prev': encode_page_token(rows[0], fields) if rows and has_prev else None
+    }
+    return rows, pagination
+
+class KeysetPage:
+    """One keyset page streamed off a CUTM1 cursor; next/prev tokens are filled in as rows are consumed"""
+
+    def __init__(self, query, projection, page_size=DEFAULT_PAGE_SIZE, after=None, before=None, total=0, annotate=None):
+        self.query = query
+        self.projection = projection
+        self.page_size = page_size
+        self.after = after
+        self.before = before
+        self.total = total
+        self.annotate = annotate
+        self.next = None
+        self.prev = None
+
+    def __bool__(self):
+        return self.total > 0
+
+    def cursor(self):
+        query = self.query
+        if self.before:
+            query = {"$and": [query, keyset_condition(self.before, "$lt")]}
+        elif self.after:
+            query = {"$and": [query, keyset_condition(self.after, "$gt")]}
+        direction = -1 if self.before else 1
+        return cutm_collection.find(query, self.projection).sort(
+            [(field, direction) for field in PAGE_SORT_FIELDS]
+        ).limit(self.page_size + 1).batch_size(EXPORT_BATCH_SIZE)
+
+    def __iter__(self):
+        if self.before:
+            # Backwards pages come off the index descending; at most page_size + 1 rows are held to restore order
+            rows, pagination = finish_keyset_page(list(self.cursor()), self.page_size, self.after, self.before)
+            self.next, self.prev = pagination['next'], pagination['prev']
+        else:
+            rows = self.cursor()
+
+        last = None
+        for index, row in enumerate(rows):
+            if index == self.page_size:
+                self.next = encode_page_token(last)
+                break
+            if index == 0 and self.after:
+                self.prev = encode_page_token(row)
+            last = row
+            yield self.annotate(row) if self.annotate else row
+
+def fetch_keyset_page(query, projection, page_size=DEFAULT_PAGE_SIZE, after=None, before=None, with_rows=True):
+    """One keyset page of CUTM1 rows (indexed find) with totals and branch/batch histograms via $facet"""
+    facets = {
+        "total": [{"$count": "count"}],
+        "students": [{"$group": {"_id": "$Reg_No"}}, {"$count": "count"}],
+        "branches": [{"$group": {"_id": "$Branch_Code", "count": {"$sum": 1}}}],
+        "years": [{"$group": {"_id": "$Batch_Year", "count": {"$sum": 1}}}]
+    }
+    pipeline = [{"$match": query}, {"$facet": facets}]
+    facet = next(cutm_collection.aggregate(pipeline, allowDiskUse=True), {})
+
+    branch_stats = {}
+    for group in facet.get("branches", []):
+        branch = get_branch_short_from_code(group["_id"])
+        branch_stats[branch] = branch_stats.get(branch, 0) + group["count"]
+    year_stats = {}
+    for group in facet.get("years", []):
+        year = group["_id"] or 'Unknown'
+        year_stats[year] = year_stats.get(year, 0) + group["count"]
+
+    # $facet sub-pipelines cannot use indexes, so the page itself comes off a sorted find()
+    rows, pagination = [], {'page_size': page_size, 'next': None, 'prev': None}
+    if with_rows:
+        page = KeysetPage(query, projection, page_size, after, before)
+        rows = list(page)
+        pagination.update({'next': page.next, 'prev': page.prev})
+    total = facet.get("total", [])
+    students = facet.get("students", [])
+    return {
+        'rows': rows,
+        'pagination': pagination,
+        'count': total[0]["count"] if total else 0,
+        'student_count': students[0]["count"] if students else 0,
+        'branch_stats': dict(sorted(branch_stats.items())),
+        'year_stats': dict(sorted(year_stats.items()))
+    }
 
-    return render_template('update_data.html')
+def get_page_request():
+    """Page size and decoded after/before cursors from the submitted form"""
+    return (
+        get_page_size(request.form.get('page_size')),
+        decode_page_token(request.form.get('after')),
+        decode_page_token(request.form.get('before'))
+    )
 
 # ---------------- Backlog ----------------
+BACKLOG_PROJECTION = {"_id": 0, "Reg_No": 1, "Subject_Code": 1, "Subject_Name": 1, "Grade": 1, "Sem": 1, "Name": 1}
+
+BACKLOG_BRANCH_INPUTS = {
+    'civil': '1', 'civil engineering': '1',
+    'cse': '2', 'computer science': '2', 'computer science engineering': '2',
+    'ece': '3', 'electronics': '3', 'electronics & communication': '3', 'electronics & communication engineering': '3',
+    'eee': '5', 'electrical': '5', 'electrical & electronics': '5', 'electrical & electronics engineering': '5',
+    'mechanical': '6', 'mechanical engineering': '6'
+}
+BACKLOG_EXPORT_COLUMNS = ["Reg No", "Name", "Branch", "Batch", "Semester", "Subject Code", "Subject Name", "Grade"]
+
+def build_backlog_query(params):
+    """Translate backlog search fields into a Mongo query, search type, criteria and error message"""
+    reg_no = (params.get('registration') or "").strip().upper()
+    subject_code = (params.get('subject_code') or "").strip().upper()
+    branch_filter = (params.get('branch') or "").strip()
+    year_filter = (params.get('year') or "").strip()
+
+    base_query = {"Grade": {"$in": BACKLOG_GRADES}}
+    search_type, message = None, None
+    search_criteria = []
+    reg_conditions = []
+
+    if not (reg_no or subject_code or branch_filter or year_filter):
+        message = "Please enter a registration number, subject code, or select branch/year to search."
+        return base_query, search_type, search_criteria, message
+
+    if reg_no:
+        search_type = 'registration'
+        base_query["Reg_No"] = reg_no
+        search_criteria.append(f"Registration: {reg_no}")
+        return base_query, search_type, search_criteria, message
+
+    if subject_code:
+        search_type = 'subject_code'
+        base_query["Subject_Code"] = subject_code
+        search_criteria.append(f"Subject Code: {subject_code}")
+    else:
+        search_type = 'advanced'
+
+    if branch_filter:
+        branch_code = BACKLOG_BRANCH_INPUTS.get(branch_filter.lower())
+        if branch_code:
+            search_criteria.append(f"Branch: {branch_filter}")
+            reg_conditions.append({"Branch_Code": branch_code})
+        else:
+            message = f"Invalid branch selection: {branch_filter}. Valid options: Civil, CSE, ECE, EEE, Mechanical"
+
+    if year_filter and not message:
+        if len(year_filter) in (2, 4) and year_filter.isdigit():
+            search_criteria.append(f"Year: {year_filter}")
+            reg_conditions.append({"Batch_Year": f"20{year_filter[-2:]}"})
+        else:
+            message = f"Invalid year format: {year_filter}. Use format: 21, 22, 2021, 2022, etc."
+
+    if reg_conditions and not message:
+        if len(reg_conditions) == 1:
+            base_query.update(reg_conditions[0])
+        else:
+            base_query["$and"] = reg_conditions
+
+    return base_query, search_type, search_criteria, message
+
+def annotate_backlog_row(row):
+    """Attach branch and batch labels derived from the registration number"""
+    row['Branch'] = get_branch_from_reg_no(row.get('Reg_No', ''))
+    row['Year'] = get_year_from_reg_no(row.get('Reg_No', ''))
+    if row['Branch'] != 'Unknown Branch':
+        row['Branch_Short'] = row['Branch'].split()[0]
+    else:
+        row['Branch_Short'] = 'Unknown'
+    return row
+
+def iter_backlog_export_rows(query):
+    """Stream export rows for a backlog query straight off the Mongo cursor"""
+    cursor = cutm_collection.find(query, BACKLOG_PROJECTION).sort(
+        [(field, 1) for field in PAGE_SORT_FIELDS]
+    ).batch_size(EXPORT_BATCH_SIZE)
+    for row in cursor:
+        annotate_backlog_row(row)
+        yield [row.get('Reg_No', ''), row.get('Name', ''), row['Branch_Short'], row['Year'],
+               row.get('Sem', ''), row.get('Subject_Code', ''), row.get('Subject_Name', ''), row.get('Grade', '')]
+
+def stream_csv(rows, columns=BACKLOG_EXPORT_COLUMNS):
+    """Encode rows as CSV one line at a time"""
+    buffer = StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(columns)
+    for row in rows:
+        writer.writerow(row)
+        yield buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate(0)
+    yield buffer.getvalue()
+
+def stream_xlsx(rows, sheet_title, columns=BACKLOG_EXPORT_COLUMNS):
+    """Write rows with a write-only workbook to a temp file, then stream the file"""
+    workbook = Workbook(write_only=True)
+    sheet = workbook.create_sheet(title=sheet_title)
+    sheet.append(columns)
+    for row in rows:
+        sheet.append(row)
+
+    with tempfile.TemporaryFile(suffix='.xlsx') as handle:
+        workbook.save(handle)
+        handle.seek(0)
+        while True:
+            chunk = handle.read(UPLOAD_COPY_BUFFER)
+            if not chunk:
+                break
+            yield chunk
+
 @app.route('/backlog', methods=['GET', 'POST'])
 def backlog():
     try:
@@ -2413,133 +3631,29 @@ def backlog():
         branch_stats = {}
         year_stats = {}
         search_criteria = []
+        pagination = None
         
         if request.method == 'POST':
-            reg_no = (request.form.get('registration') or "").strip().upper()
-            subject_code = (request.form.get('subject_code') or "").strip().upper()
-            branch_filter = (request.form.get('branch') or "").strip()
-            year_filter = (request.form.get('year') or "").strip()
-
-            base_query = {"Grade": {"$in": ["F", "M", "S", "I", "R"]}}
-            reg_conditions = []
-            
-            def get_branch_code_from_input(branch_input):
-                branch_mapping = {
-                    'civil': '1', 'civil engineering': '1',
-                    'cse': '2', 'computer science': '2', 'computer science engineering': '2',
-                    'ece': '3', 'electronics': '3', 'electronics & communication': '3', 'electronics & communication engineering': '3',
-                    'eee': '5', 'electrical': '5', 'electrical & electronics': '5', 'electrical & electronics engineering': '5',
-                    'mechanical': '6', 'mechanical engineering': '6'
-                }
-                
-                branch_lower = branch_input.lower().strip()
-                return branch_mapping.get(branch_lower)
-            
-            if reg_no:
-                search_type = 'registration'
-                base_query["Reg_No"] = reg_no
-                search_criteria.append(f"Registration: {reg_no}")
-                
-            elif subject_code:
-                search_type = 'subject_code'
-                base_query["Subject_Code"] = subject_code
-                search_criteria.append(f"Subject Code: {subject_code}")
-                
-                if branch_filter:
-                    branch_code = get_branch_code_from_input(branch_filter)
-                    
-                    if branch_code:
-                        search_criteria.append(f"Branch: {branch_filter}")
-                        reg_conditions.append({"Reg_No": {"$regex": f"^.{{{7}}}{branch_code}"}})
-                    else:
-                        message = f"Invalid branch selection: {branch_filter}. Valid options: Civil, CSE, ECE, EEE, Mechanical"
-                
-                if year_filter and not message:
-                    year_short = year_filter
-                    
-                    if len(year_filter) == 4 and year_filter.isdigit():
-                        year_short = year_filter[-2:]
-                    elif len(year_filter) == 2 and year_filter.isdigit():
-                        year_short = year_filter
-                    else:
-                        message = f"Invalid year format: {year_filter}. Use format: 21, 22, 2021, 2022, etc."
-                    
-                    if not message:
-                        search_criteria.append(f"Year: {year_filter}")
-                        reg_conditions.append({"Reg_No": {"$regex": f"^{year_short}"}})
-                
-                if reg_conditions and not message:
-                    if len(reg_conditions) == 1:
-                        base_query.update(reg_conditions[0])
-                    else:
-                        base_query["$and"] = reg_conditions
-                        
-            elif branch_filter or year_filter:
-                search_type = 'advanced'
-                
-                if branch_filter:
-                    branch_code = get_branch_code_from_input(branch_filter)
-                    
-                    if branch_code:
-                        search_criteria.append(f"Branch: {branch_filter}")
-                        reg_conditions.append({"Reg_No": {"$regex": f"^.{{{7}}}{branch_code}"}})
-                    else:
-                        message = f"Invalid branch selection: {branch_filter}. Valid options: Civil, CSE, ECE, EEE, Mechanical"
-                
-                if year_filter and not message:
-                    year_short = year_filter
-                    
-                    if len(year_filter) == 4 and year_filter.isdigit():
-                        year_short = year_filter[-2:]
-                    elif len(year_filter) == 2 and year_filter.isdigit():
-                        year_short = year_filter
-                    else:
-                        message = f"Invalid year format: {year_filter}. Use format: 21, 22, 2021, 2022, etc."
-                    
-                    if not message:
-                        search_criteria.append(f"Year: {year_filter}")
-                        reg_conditions.append({"Reg_No": {"$regex": f"^{year_short}"}})
-                
-                if reg_conditions and not message:
-                    if len(reg_conditions) == 1:
-                        base_query.update(reg_conditions[0])
-                    else:
-                        base_query["$and"] = reg_conditions
-
-            if not message and (reg_no or subject_code or branch_filter or year_filter):
-                cursor = cutm_collection.find(
-                    base_query,
-                    {"_id": 0, "Reg_No": 1, "Subject_Code": 1, "Subject_Name": 1, 
-                     "Grade": 1, "Sem": 1, "Name": 1}
-                )
-                result = list(cursor)
-                count = len(result)
-                
-                for row in result:
-                    row['Branch'] = get_branch_from_reg_no(row.get('Reg_No', ''))
-                    row['Year'] = get_year_from_reg_no(row.get('Reg_No', ''))
-                    if row['Branch'] != 'Unknown Branch':
-                        row['Branch_Short'] = row['Branch'].split()[0]
-                    else:
-                        row['Branch_Short'] = 'Unknown'
-                
-                for row in result:
-                    branch = row.get('Branch_Short', 'Unknown')
-                    year = row.get('Year', 'Unknown')
-                    branch_stats[branch] = branch_stats.get(branch, 0) + 1
-                    year_stats[year] = year_stats.get(year, 0) + 1
+            base_query, search_type, search_criteria, message = build_backlog_query(request.form)
+
+            if not message:
+                page_size, after, before = get_page_request()
+                page = fetch_keyset_page(base_query, BACKLOG_PROJECTION, page_size, after, before)
+                result = [annotate_backlog_row(row) for row in page['rows']]
+                pagination = page['pagination']
+                count = page['count']
+                branch_stats = page['branch_stats']
+                year_stats = page['year_stats']
                 
                 if count == 0:
+                    criteria_text = ", ".join(search_criteria)
                     if search_type == 'registration':
+                        reg_no = (request.form.get('registration') or "").strip().upper()
                         message = f"No backlog found for registration number {reg_no}."
                     elif search_type == 'subject_code':
-                        criteria_text = ", ".join(search_criteria)
                         message = f"No students found with backlog for: {criteria_text}."
                     elif search_type == 'advanced':
-                        criteria_text = ", ".join(search_criteria)
                         message = f"No backlog found for criteria: {criteria_text}."
-            elif not (reg_no or subject_code or branch_filter or year_filter):
-                message = "Please enter a registration number, subject code, or select branch/year to search."
 
         return render_template('backlog.html', 
                              result=result, 
@@ -2548,11 +3662,44 @@ def backlog():
                              search_type=search_type,
                              branch_stats=branch_stats,
                              year_stats=year_stats,
-                             search_criteria=search_criteria)
+                             search_criteria=search_criteria,
+                             pagination=pagination)
     except Exception as e:
         return render_template('backlog.html', error=str(e))
 
+@app.route('/backlog/export')
+def backlog_export():
+    export_format = (request.args.get('format') or 'csv').lower()
+    if export_format not in ('csv', 'xlsx'):
+        return jsonify({'error': 'Unsupported export format'}), 400
+
+    base_query, _, _, message = build_backlog_query(request.args)
+    if message:
+        return jsonify({'error': message}), 400
+
+    filename = f"backlog_results_{datetime.now().strftime('%Y-%m-%d')}.{export_format}"
+    rows = iter_backlog_export_rows(base_query)
+    if export_format == 'csv':
+        body, mimetype = stream_csv(rows), 'text/csv'
+    else:
+        body = stream_xlsx(rows, 'Backlog Results')
+        mimetype = 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
+
+    return Response(stream_with_context(body), mimetype=mimetype,
+                    headers={'Content-Disposition': f'attachment; filename={filename}'})
+
 # ---------------- Batch Route ----------------
+BATCH_PROJECTION = {"_id": 0, "Reg_No": 1, "Name": 1, "Sem": 1,
+                    "Subject_Code": 1, "Subject_Name": 1, "Credits": 1, "Grade": 1}
+
+def annotate_batch_row(row):
+    """Attach branch and batch labels to a batch row as it is rendered"""
+    reg_no = row.get('Reg_No', '')
+    row['Branch'] = get_branch_from_reg_no(reg_no)
+    row['Batch'] = get_year_from_reg_no(reg_no)
+    row['Branch_Short'] = row['Branch'].split()[0] if row['Branch'] != 'Unknown Branch' else 'Unknown'
+    return row
+
 @app.route('/batch', methods=['GET', 'POST'])
 def batch():
     try:
@@ -2560,6 +3707,9 @@ def batch():
         branch_stats = {}
         batch_stats = {}
         search_criteria = []
+        pagination = None
+        students = []
+        view = request.form.get('view') or 'subjects'
         
         if request.method == 'POST':
             branch_filter = (request.form.get('branch') or "").strip()
@@ -2567,6 +3717,7 @@ def batch():
             
             base_query = {}
             reg_conditions = []
+            summary_branch = summary_batch = None
             
             def get_branch_code_from_input(branch_input):
                 branch_mapping = {
@@ -2585,7 +3736,8 @@ def batch():
                 
                 if branch_code:
                     search_criteria.append(f"Branch: {branch_filter}")
-                    reg_conditions.append({"Reg_No": {"$regex": f"^.{{{7}}}{branch_code}"}})
+                    reg_conditions.append({"Branch_Code": branch_code})
+                    summary_branch = BRANCH_NAMES[branch_code]
                 else:
                     message = f"Invalid branch selection: {branch_filter}. Valid options: Civil, CSE, ECE, EEE, Mechanical"
             
@@ -2601,7 +3753,8 @@ def batch():
                 
                 if not message:
                     search_criteria.append(f"Batch: {batch_filter}")
-                    reg_conditions.append({"Reg_No": {"$regex": f"^{batch_short}"}})
+                    reg_conditions.append({"Batch_Year": f"20{batch_short}"})
+                    summary_batch = f"20{batch_short}"
             
             if reg_conditions and not message:
                 if len(reg_conditions) == 1:
@@ -2609,37 +3762,28 @@ def batch():
                 else:
                     base_query["$and"] = reg_conditions
             
-            if not message and (branch_filter or batch_filter):
+            if not message and (branch_filter or batch_filter) and view == 'summary':
+                students = get_cohort_summaries(summary_batch, summary_branch)
+                count = len(students)
+                for student in students:
+                    branch = get_branch_short_from_code(get_branch_code_from_reg_no(student['Reg_No']))
+                    branch_stats[branch] = branch_stats.get(branch, 0) + 1
+                    batch_stats[student['Batch']] = batch_stats.get(student['Batch'], 0) + 1
+                criteria_text = ", ".join(search_criteria)
+                if count == 0:
+                    message = f"No student summaries found for criteria: {criteria_text}."
+                else:
+                    message = f"Found {count} students matching: {criteria_text}."
+            elif not message and (branch_filter or batch_filter):
                 if base_query:
-                    cursor = cutm_collection.find(
-                        base_query,
-                        {"_id": 0, "Reg_No": 1, "Name": 1, "Sem": 1, 
-                         "Subject_Code": 1, "Subject_Name": 1, "Credits": 1, "Grade": 1}
-                    ).sort([("Reg_No", 1), ("Sem", 1), ("Subject_Code", 1)])
-                    
-                    result = list(cursor)
-                    count = len(result)
-                    
-                    unique_students = set()
-                    for row in result:
-                        reg_no = row.get('Reg_No', '')
-                        row['Branch'] = get_branch_from_reg_no(reg_no)
-                        row['Batch'] = get_year_from_reg_no(reg_no)
-                        
-                        if row['Branch'] != 'Unknown Branch':
-                            row['Branch_Short'] = row['Branch'].split()[0]
-                        else:
-                            row['Branch_Short'] = 'Unknown'
-                        
-                        unique_students.add(reg_no)
-                    
-                    for row in result:
-                        branch = row.get('Branch_Short', 'Unknown')
-                        batch = row.get('Batch', 'Unknown')
-                        branch_stats[branch] = branch_stats.get(branch, 0) + 1
-                        batch_stats[batch] = batch_stats.get(batch, 0) + 1
-                    
-                    student_count = len(unique_students)
+                    page_size, after, before = get_page_request()
+                    stats = fetch_keyset_page(base_query, BATCH_PROJECTION, with_rows=False)
+                    count = stats['count']
+                    student_count = stats['student_count']
+                    branch_stats = stats['branch_stats']
+                    batch_stats = stats['year_stats']
+                    result = pagination = KeysetPage(base_query, BATCH_PROJECTION, page_size, after, before,
+                                                     total=count, annotate=annotate_batch_row)
                     
                     if count == 0:
                         criteria_text = ", ".join(search_criteria)
@@ -2652,13 +3796,16 @@ def batch():
             elif not message:
                 message = "Please select branch and/or batch to view data."
         
-        return render_template('batch.html', 
+        return Response(stream_with_context(stream_template('batch.html', 
                              result=result, 
                              count=count, 
                              message=message,
                              branch_stats=branch_stats,
                              batch_stats=batch_stats,
-                             search_criteria=search_criteria)
+                             search_criteria=search_criteria,
+                             pagination=pagination,
+                             students=students,
+                             view=view)))
                              
     except Exception as e:
         return render_template('batch.html', error=str(e))
@@ -2707,7 +3854,7 @@ def view_data():
                     cursor = cutm_collection.find(
                         {"Reg_No": registration},
                         {"Reg_No": 1, "Name": 1, "Sem": 1, "Subject_Code": 1, 
-                         "Subject_Name": 1, "Credits": 1, "Grade": 1, "_id": 0}
+                         "Subject_Name": 1, "Credits": 1, "Credits_Total": 1, "Grade": 1, "_id": 0}
                     ).sort([("Sem", 1), ("Subject_Code", 1)])
                     
                     student_data = list(cursor)
@@ -2723,14 +3870,7 @@ def view_data():
                                 record.get('Credits', ''),
                                 record.get('Grade', '')) for record in student_data]
                         
-                        for record in student_data:
-                            credits_str = record.get("Credits") or ""
-                            parts = [p for p in str(credits_str).split('+') if p.strip() != ""]
-                            if parts:
-                                try:
-                                    total_credits += sum(float(part) for part in parts)
-                                except ValueError:
-                                    continue
+                        total_credits = sum_credits(student_data)
                         
             elif 'reg_no' in request.form and 'subject_code' in request.form:
                 reg_no = (request.form.get('reg_no') or "").strip().upper()
@@ -2744,17 +3884,20 @@ def view_data():
                 else:
                     result = cutm_collection.update_one(
                         {"Reg_No": reg_no, "Subject_Code": subject_code},
-                        {"$set": {"Grade": new_grade}}
+                        {"$set": {"Grade": new_grade, "Grade_Point": grade_point(new_grade)}}
                     )
                     
                     if result.modified_count > 0:
+                        refresh_student_summaries([reg_no])
+                        bump_cohort_versions([reg_no])
+                        refresh_cohort_ranks([reg_no])
                         message = f"Grade updated successfully for {subject_code}!"
                         registration = reg_no
                         
                         cursor = cutm_collection.find(
                             {"Reg_No": registration},
                             {"Reg_No": 1, "Name": 1, "Sem": 1, "Subject_Code": 1, 
-                             "Subject_Name": 1, "Credits": 1, "Grade": 1, "_id": 0}
+                             "Subject_Name": 1, "Credits": 1, "Credits_Total": 1, "Grade": 1, "_id": 0}
                         ).sort([("Sem", 1), ("Subject_Code", 1)])
                         
                         student_data = list(cursor)
@@ -2766,14 +3909,7 @@ def view_data():
                                 record.get('Credits', ''),
                                 record.get('Grade', '')) for record in student_data]
                         
-                        for record in student_data:
-                            credits_str = record.get("Credits") or ""
-                            parts = [p for p in str(credits_str).split('+') if p.strip() != ""]
-                            if parts:
-                                try:
-                                    total_credits += sum(float(part) for part in parts)
-                                except ValueError:
-                                    continue
+                        total_credits = sum_credits(student_data)
                     else:
                         error = "No record found to update or grade was already the same."
         
@@ -2789,6 +3925,9 @@ def view_data():
 
 # ---------------- CBCS/Basket Management ----------------
 
+CBCS_PAGE_FIELDS = ["Subject Code", "_id"]
+CBCS_PAGE_SIZE = 20
+
 @app.route('/basket')
 def basket():
     """Display all CBCS subjects with search and filter options"""
@@ -2803,31 +3942,35 @@ def basket():
         if basket:
             query['Basket'] = basket
         if search:
-            query['$or'] = [
-                {'Subject_name': {'$regex': search, '$options': 'i'}},
-                {'Subject Code': {'$regex': search, '$options': 'i'}}
-            ]
-        
-        page = int(request.args.get('page', 1))
-        per_page = 20
-        skip = (page - 1) * per_page
-        
-        subjects = list(cbcs_collection.find(query).skip(skip).limit(per_page))
-        total_subjects = cbcs_collection.count_documents(query)
-        
-        if subjects:
-            print("DEBUG - Sample subject fields:", subjects[0].keys())
-        
-        branches = sorted([b for b in cbcs_collection.distinct('Branch') if b])
-        baskets = sorted([b for b in cbcs_collection.distinct('Basket') if b])
+            # Same case-insensitive substring match as before, resolved by the in-memory index
+            index = get_cbcs_search_index()
+            query['_id'] = {'$in': [ObjectId(index.subjects[i]['id']) for i in index.substring(search)]}
+        
+        page = max(request.args.get('page', 1, type=int) or 1, 1)
+        per_page = CBCS_PAGE_SIZE
+        after = decode_page_token(request.args.get('after'), CBCS_PAGE_FIELDS)
+        before = decode_page_token(request.args.get('before'), CBCS_PAGE_FIELDS)
+        
+        page_query = query
+        if before:
+            page_query = {"$and": [query, keyset_condition(before, "$lt", CBCS_PAGE_FIELDS)]}
+        elif after:
+            page_query = {"$and": [query, keyset_condition(after, "$gt", CBCS_PAGE_FIELDS)]}
+        direction = -1 if before else 1
+        rows = list(cbcs_collection.find(page_query).sort([(field, direction) for field in CBCS_PAGE_FIELDS]).limit(per_page + 1))
+        subjects, pagination = finish_keyset_page(rows, per_page, after, before, CBCS_PAGE_FIELDS)
+        
+        facets = get_cbcs_facets()
+        total_subjects = count_cbcs_subjects(query)
         
         return render_template('basket.html', 
                              subjects=subjects,
-                             branches=branches,
-                             baskets=baskets,
+                             branches=facets['branches'],
+                             baskets=facets['baskets'],
                              current_page=page,
                              total_pages=(total_subjects + per_page - 1) // per_page,
                              total_subjects=total_subjects,
+                             pagination=pagination,
                              filters={'branch': branch, 'basket': basket, 'search': search})
     except Exception as e:
         print(f"ERROR in basket route: {str(e)}")
@@ -2845,25 +3988,25 @@ def basket_add():
                 'Subject_name': request.form.get('subject_name', '').strip(),
                 'Credits': request.form.get('credits', '').strip()
             }
+            subject_data.update(numeric_fields(subject_data['Credits']))
+            subject_data['Branch_Tokens'] = branch_tokens(subject_data['Branch'])
             
             if not all([subject_data['Branch'], subject_data['Subject Code'], subject_data['Subject_name']]):
                 error = 'Branch, Subject Code, and Subject Name are required'
-                branches = sorted([b for b in cbcs_collection.distinct('Branch') if b]) or ['All', 'CSE', 'ECE', 'EEE', 'Civil', 'Mechanical']
-                baskets = sorted([b for b in cbcs_collection.distinct('Basket') if b]) or ['Basket I', 'Basket II', 'Basket III', 'Basket IV', 'Basket V']
+                branches, baskets = get_basket_form_options()
                 return render_template('basket_add.html', error=error, branches=branches, baskets=baskets)
             
             existing = cbcs_collection.find_one({'Subject Code': subject_data['Subject Code']})
             if existing:
                 error = 'Subject Code already exists'
-                branches = sorted([b for b in cbcs_collection.distinct('Branch') if b]) or ['All', 'CSE', 'ECE', 'EEE', 'Civil', 'Mechanical']
-                baskets = sorted([b for b in cbcs_collection.distinct('Basket') if b]) or ['Basket I', 'Basket II', 'Basket III', 'Basket IV', 'Basket V']
+                branches, baskets = get_basket_form_options()
                 return render_template('basket_add.html', error=error, branches=branches, baskets=baskets)
             
             cbcs_collection.insert_one(subject_data)
+            bump_cbcs_catalogue_version()
             return redirect('/basket?success=Subject added successfully')
         
-        branches = sorted([b for b in cbcs_collection.distinct('Branch') if b]) or ['All', 'CSE', 'ECE', 'EEE', 'Civil', 'Mechanical']
-        baskets = sorted([b for b in cbcs_collection.distinct('Basket') if b]) or ['Basket I', 'Basket II', 'Basket III', 'Basket IV', 'Basket V']
+        branches, baskets = get_basket_form_options()
         
         return render_template('basket_add.html', branches=branches, baskets=baskets)
     except Exception as e:
@@ -2884,12 +4027,13 @@ def basket_edit(subject_id):
                 'Subject_name': request.form.get('subject_name', '').strip(),
                 'Credits': request.form.get('credits', '').strip()
             }
+            update_data.update(numeric_fields(update_data['Credits']))
+            update_data['Branch_Tokens'] = branch_tokens(update_data['Branch'])
             
             if not all([update_data['Branch'], update_data['Subject Code'], update_data['Subject_name']]):
                 error = 'Branch, Subject Code, and Subject Name are required'
                 subject = cbcs_collection.find_one({'_id': ObjectId(subject_id)})
-                branches = sorted([b for b in cbcs_collection.distinct('Branch') if b]) or ['All', 'CSE', 'ECE', 'EEE', 'Civil', 'Mechanical']
-                baskets = sorted([b for b in cbcs_collection.distinct('Basket') if b]) or ['Basket I', 'Basket II', 'Basket III', 'Basket IV', 'Basket V']
+                branches, baskets = get_basket_form_options()
                 return render_template('basket_edit.html', error=error, subject=subject, branches=branches, baskets=baskets)
             
             existing = cbcs_collection.find_one({
@@ -2899,8 +4043,7 @@ def basket_edit(subject_id):
             if existing:
                 error = 'Subject Code already exists'
                 subject = cbcs_collection.find_one({'_id': ObjectId(subject_id)})
-                branches = sorted([b for b in cbcs_collection.distinct('Branch') if b]) or ['All', 'CSE', 'ECE', 'EEE', 'Civil', 'Mechanical']
-                baskets = sorted([b for b in cbcs_collection.distinct('Basket') if b]) or ['Basket I', 'Basket II', 'Basket III', 'Basket IV', 'Basket V']
+                branches, baskets = get_basket_form_options()
                 return render_template('basket_edit.html', error=error, subject=subject, branches=branches, baskets=baskets)
             
             result = cbcs_collection.update_one(
@@ -2911,14 +4054,14 @@ def basket_edit(subject_id):
             if result.matched_count == 0:
                 return render_template('basket_edit.html', error='Subject not found')
             
+            bump_cbcs_catalogue_version()
             return redirect('/basket?success=Subject updated successfully')
         
         subject = cbcs_collection.find_one({'_id': ObjectId(subject_id)})
         if not subject:
             return redirect('/basket?error=Subject not found')
         
-        branches = sorted([b for b in cbcs_collection.distinct('Branch') if b]) or ['All', 'CSE', 'ECE', 'EEE', 'Civil', 'Mechanical']
-        baskets = sorted([b for b in cbcs_collection.distinct('Basket') if b]) or ['Basket I', 'Basket II', 'Basket III', 'Basket IV', 'Basket V']
+        branches, baskets = get_basket_form_options()
         
         return render_template('basket_edit.html', subject=subject, branches=branches, baskets=baskets)
     
@@ -2938,44 +4081,89 @@ def basket_delete(subject_id):
         if result.deleted_count == 0:
             return jsonify({'error': 'Subject not found'}), 404
         
+        bump_cbcs_catalogue_version()
         return jsonify({'success': True, 'message': 'Subject deleted successfully'})
     
     except Exception as e:
         return jsonify({'error': str(e)}), 400
 
+# ---------------- CBCS Import ----------------
+CBCS_IMPORT_COLUMNS = ['Branch', 'Basket', 'Subject Code', 'Subject_name', 'Credits']
+CBCS_IMPORT_BATCH_SIZE = 1000
+
+def build_cbcs_import_records(df):
+    """Vectorized CSV -> CBCS documents; rows without a subject code are dropped"""
+    df = df.dropna(how='all').fillna('')
+    frame = pd.DataFrame(index=df.index)
+    for column in CBCS_IMPORT_COLUMNS:
+        frame[column] = df[column].astype(str).str.strip() if column in df.columns else ''
+    frame['Subject Code'] = frame['Subject Code'].str.upper()
+    frame = frame[frame['Subject Code'] != '']
+
+    # Credits and branches repeat heavily, so derive their fields once per distinct value
+    credit_fields = {c: numeric_fields(c) for c in frame['Credits'].unique()}
+    token_fields = {b: branch_tokens(b) for b in frame['Branch'].unique()}
+
+    records = frame.to_dict('records')
+    for record in records:
+        fields = credit_fields[record['Credits']]
+        record['Credits_Parts'] = list(fields['Credits_Parts'])
+        record['Credits_Total'] = fields['Credits_Total']
+        record['Branch_Tokens'] = list(token_fields[record['Branch']])
+    return records, len(df)
+
+def swap_cbcs_catalogue(records, timings):
+    """Load records into an indexed staging collection and rename it over cbcs in one step"""
+    staging = db.get_collection(f"{cbcs_collection.name}_staging_{uuid.uuid4().hex[:8]}")
+    try:
+        started = time.perf_counter()
+        create_cbcs_indexes(staging)
+        timings['index'] = time.perf_counter() - started
+
+        started = time.perf_counter()
+        for start in range(0, len(records), CBCS_IMPORT_BATCH_SIZE):
+            staging.insert_many(records[start:start + CBCS_IMPORT_BATCH_SIZE], ordered=False)
+        timings['load'] = time.perf_counter() - started
+
+        loaded = staging.count_documents({})
+        if loaded != len(records):
+            raise RuntimeError(f"staging holds {loaded} of {len(records)} subjects")
+
+        started = time.perf_counter()
+        staging.rename(cbcs_collection.name, dropTarget=True)
+        timings['swap'] = time.perf_counter() - started
+        return loaded
+    except Exception:
+        staging.drop()
+        raise
+
 @app.route('/basket/import')
 def basket_import():
     """Import CBCS data from CSV file"""
     try:
-        import os
         csv_path = 'CBCS.csv'
         if not os.path.exists(csv_path):
             return f"Error: CSV file '{csv_path}' not found. Please upload your CBCS.csv file to the project directory."
         
+        timings = {}
+        started = time.perf_counter()
         df = pd.read_csv(csv_path)
-        df = df.dropna(how='all')
-        df = df.fillna('')
-        
-        records = []
-        for _, row in df.iterrows():
-            if pd.isna(row.get('Subject Code')) or str(row.get('Subject Code', '')).strip() == '':
-                continue
-                
-            record = {
-                'Branch': str(row.get('Branch', '')).strip() if not pd.isna(row.get('Branch')) else '',
-                'Basket': str(row.get('Basket', '')).strip() if not pd.isna(row.get('Basket')) else '',
-                'Subject Code': str(row.get('Subject Code', '')).strip().upper() if not pd.isna(row.get('Subject Code')) else '',
-                'Subject_name': str(row.get('Subject_name', '')).strip() if not pd.isna(row.get('Subject_name')) else '',
-                'Credits': str(row.get('Credits', '')).strip() if not pd.isna(row.get('Credits')) else ''
-            }
-            
-            if record['Subject Code']:
-                records.append(record)
+        timings['read'] = time.perf_counter() - started
+
+        started = time.perf_counter()
+        records, row_count = build_cbcs_import_records(df)
+        timings['build'] = time.perf_counter() - started
         
         if records:
-            cbcs_collection.delete_many({})
-            cbcs_collection.insert_many(records)
-            return f"<h2>Import Successful!</h2><p>Successfully imported {len(records)} CBCS subjects!</p><a href='/basket'>← Back to CBCS Management</a>"
+            previous = cbcs_collection.estimated_document_count()
+            imported = swap_cbcs_catalogue(records, timings)
+            bump_cbcs_catalogue_version()
+            print(f"CBCS import: {imported} subjects from {row_count} rows, replaced {previous}; "
+                  + ", ".join(f"{k} {v:.3f}s" for k, v in timings.items()))
+            timing_html = "".join(f"<li>{step.title()}: {seconds * 1000:.1f} ms</li>" for step, seconds in timings.items())
+            return (f"<h2>Import Successful!</h2><p>Successfully imported {imported} CBCS subjects!</p>"
+                    f"<p>CSV rows: {row_count} &middot; Skipped (no subject code): {row_count - imported} &middot; Replaced: {previous}</p>"
+                    f"<ul>{timing_html}</ul><a href='/basket'>← Back to CBCS Management</a>")
         else:
             return "<h2>Import Failed</h2><p>No valid records found in CSV file.</p><a href='/basket'>← Back to CBCS Management</a>"
         
@@ -3018,6 +4206,364 @@ def basket_debug():
 
 
 
+# ---------------- CBCS Catalogue Cache ----------------
+CBCS_CATALOGUE_VERSION_ID = 'cbcs_catalogue'
+BASKET_ALIASES = {
+    'Basket 1': 'Basket I', 'Basket 2': 'Basket II', 'Basket 3': 'Basket III',
+    'Basket 4': 'Basket IV', 'Basket 5': 'Basket V'
+}
+# Each entry carries the catalogue version it was built from and is replaced whole, never patched
+_cbcs_catalogue_cache = {}
+_cbcs_facet_cache = {'entry': None}
+DEFAULT_CBCS_BRANCHES = ['All', 'CSE', 'ECE', 'EEE', 'Civil', 'Mechanical']
+DEFAULT_CBCS_BASKETS = ['Basket I', 'Basket II', 'Basket III', 'Basket IV', 'Basket V']
+
+def normalize_basket_name(basket):
+    """Canonical basket name; blank baskets default to Basket V"""
+    if basket in (None, '', 'null'):
+        return 'Basket V'
+    return BASKET_ALIASES.get(basket, basket)
+
+def get_cbcs_catalogue_version():
+    """Current version of the CBCS catalogue, bumped on every basket write"""
+    doc = cache_versions_collection.find_one({"_id": CBCS_CATALOGUE_VERSION_ID}, {"Version": 1})
+    return doc.get("Version", 0) if doc else 0
+
+def bump_cbcs_catalogue_version():
+    """Invalidate cached CBCS catalogues in every worker"""
+    cache_versions_collection.update_one(
+        {"_id": CBCS_CATALOGUE_VERSION_ID},
+        {"$inc": {"Version": 1}, "$set": {"Updated_At": datetime.utcnow()}},
+        upsert=True
+    )
+
+def get_cbcs_facets():
+    """Branch/basket lists and per-filter counts of the CBCS catalogue, cached until the next basket write"""
+    version = get_cbcs_catalogue_version()
+    facets = _cbcs_facet_cache['entry']
+    if facets is None or facets['version'] != version:
+        facets = {
+            'version': version,
+            'branches': sorted(b for b in cbcs_collection.distinct('Branch') if b),
+            'baskets': sorted(b for b in cbcs_collection.distinct('Basket') if b),
+            'counts': {}
+        }
+        _cbcs_facet_cache['entry'] = facets
+    return facets
+
+def get_basket_form_options():
+    """Branch and basket choices for the add/edit forms, with defaults for an empty catalogue"""
+    facets = get_cbcs_facets()
+    return facets['branches'] or DEFAULT_CBCS_BRANCHES, facets['baskets'] or DEFAULT_CBCS_BASKETS
+
+def count_cbcs_subjects(query):
+    """count_documents() of a /basket filter; only known branch/basket filters are cached"""
+    facets = get_cbcs_facets()
+    branch, basket = query.get('Branch'), query.get('Basket')
+    cacheable = (set(query) <= {'Branch', 'Basket'}
+                 and (branch is None or branch in facets['branches'])
+                 and (basket is None or basket in facets['baskets']))
+    if not cacheable:
+        return cbcs_collection.count_documents(query)
+    counts = facets['counts']
+    if (branch, basket) not in counts:
+        counts[(branch, basket)] = cbcs_collection.count_documents(query)
+    return counts[(branch, basket)]
+
+def cbcs_branch_query(branch_code):
+    """Indexed match of the CBCS subjects offered to a branch, including 'All' subjects"""
+    return {"Branch_Tokens": {"$in": [branch_code, BRANCH_TOKEN_ALL] if branch_code else [BRANCH_TOKEN_ALL]}}
+
+def build_cbcs_catalogue(branch_code):
+    """Normalized per-basket CBCS subjects of a branch, with numeric credits"""
+    projection = {"_id": 0, "Subject Code": 1, "Subject_name": 1, "Credits": 1,
+                  "Credits_Total": 1, "Basket": 1, "Branch": 1}
+    baskets = {}
+    for subject in cbcs_collection.find(cbcs_branch_query(branch_code), projection):
+        credits_numeric = subject.get('Credits_Total')
+        if credits_numeric is None:
+            credits_numeric = parse_credits_normalized(subject.get('Credits', ''))
+        baskets.setdefault(normalize_basket_name(subject.get('Basket')), []).append({
+            'code': subject.get('Subject Code'),
+            'name': subject.get('Subject_name', ''),
+            'credits': subject.get('Credits', ''),
+            'credits_numeric': credits_numeric,
+            'original_basket': subject.get('Basket'),
+            'branch': subject.get('Branch')
+        })
+    return [{'_id': name, 'subjects': baskets[name]} for name in sorted(baskets)]
+
+def get_cbcs_catalogue(branch_code, basket=None):
+    """Cached CBCS catalogue of a branch, optionally limited to one raw basket value"""
+    version = get_cbcs_catalogue_version()
+    entry = _cbcs_catalogue_cache.get(branch_code)
+    if entry is None or entry['version'] != version:
+        entry = {'version': version, 'catalogue': build_cbcs_catalogue(branch_code)}
+        _cbcs_catalogue_cache[branch_code] = entry
+    catalogue = entry['catalogue']
+
+    # Hand out fresh containers so callers can annotate without touching the cache
+    selected = []
+    for entry in catalogue:
+        subjects = [s for s in entry['subjects'] if not basket or basket == 'All' or s['original_basket'] == basket]
+        if subjects:
+            selected.append({'_id': entry['_id'], 'subjects': subjects, 'total_subjects': len(subjects)})
+    return selected
+
+# ---------------- CBCS Search Index ----------------
+SEARCH_RESULT_LIMIT = 10
+SEARCH_MAX_LIMIT = 50
+_cbcs_search_cache = {'entry': None}
+
+def trigrams(text):
+    """Set of three-character substrings of a lowercased string"""
+    return {text[i:i + 3] for i in range(len(text) - 2)}
+
+class CBCSSearchIndex:
+    """In-memory CBCS lookup: prefix trie over subject codes, word and trigram postings over names"""
+
+    def __init__(self, subjects):
+        self.subjects = []
+        self.code_trie = {}
+        self.words = {}
+        self.grams = {}
+        # Insert in code order so trie postings come back already sorted
+        for subject in sorted(subjects, key=lambda s: str(s.get('Subject Code') or '').upper()):
+            self.add(subject)
+        self.sorted_words = sorted(self.words)
+
+    def add(self, subject):
+        position = len(self.subjects)
+        code = str(subject.get('Subject Code') or '').upper()
+        name = str(subject.get('Subject_name') or '')
+        text = f"{code} {name}".lower()
+        self.subjects.append({
+            'id': str(subject['_id']),
+            'code': code,
+            'name': name,
+            'branch': subject.get('Branch', ''),
+            'basket': subject.get('Basket', ''),
+            'credits': subject.get('Credits', ''),
+            'fields': (code.lower(), name.lower())
+        })
+
+        node = self.code_trie
+        for char in code:
+            node = node.setdefault(char, {})
+            node.setdefault('', []).append(position)
+        for word in re.findall(r'\w+', text):
+            self.words.setdefault(word, set()).add(position)
+        for gram in trigrams(text):
+            self.grams.setdefault(gram, set()).add(position)
+
+    def code_prefix(self, prefix):
+        """Positions of subjects whose code starts with prefix"""
+        node = self.code_trie
+        for char in prefix:
+            node = node.get(char)
+            if node is None:
+                return []
+        return node.get('', [])
+
+    def word_prefix(self, prefix):
+        """Positions of subjects having a word that starts with prefix"""
+        positions = set()
+        start = bisect_right(self.sorted_words, prefix) - 1
+        for word in self.sorted_words[max(start, 0):]:
+            if word.startswith(prefix):
+                positions |= self.words[word]
+            elif word > prefix:
+                break
+        return positions
+
+    def substring(self, needle):
+        """Positions whose code or name contains needle (case-insensitive), via trigram candidates"""
+        needle = needle.lower()
+        if len(needle) < 3:
+            candidates = range(len(self.subjects))
+        else:
+            postings = sorted((self.grams.get(gram, set()) for gram in trigrams(needle)), key=len)
+            candidates = set.intersection(*postings)
+        return {i for i in candidates if any(needle in field for field in self.subjects[i]['fields'])}
+
+    def search(self, query, limit=SEARCH_RESULT_LIMIT):
+        """Autocomplete matches: code-prefix hits first, then names matching every query word"""
+        query = query.strip()
+        if not query:
+            return []
+        ranked = list(self.code_prefix(query.upper().replace(' ', '')))
+        seen = set(ranked)
+
+        tokens = re.findall(r'\w+', query.lower())
+        if tokens:
+            matches = self.substring(tokens[0])
+            for token in tokens[1:]:
+                matches &= self.substring(token)
+            word_hits = self.word_prefix(tokens[-1])
+            extra = sorted(matches - seen, key=lambda i: (i not in word_hits, self.subjects[i]['code']))
+            ranked.extend(extra)
+
+        return [self.public(i) for i in ranked[:limit]]
+
+    def public(self, position):
+        subject = self.subjects[position]
+        return {key: subject[key] for key in ('id', 'code', 'name', 'branch', 'basket', 'credits')}
+
+def get_cbcs_search_index():
+    """Search index over the CBCS catalogue, rebuilt after basket writes"""
+    version = get_cbcs_catalogue_version()
+    entry = _cbcs_search_cache['entry']
+    if entry is None or entry['version'] != version:
+        projection = {"Subject Code": 1, "Subject_name": 1, "Branch": 1, "Basket": 1, "Credits": 1}
+        entry = {'version': version, 'index': CBCSSearchIndex(cbcs_collection.find({}, projection))}
+        _cbcs_search_cache['entry'] = entry
+    return entry['index']
+
+@app.route('/basket/search')
+def basket_search():
+    """JSON autocomplete over CBCS subject codes and names"""
+    query = (request.args.get('q') or '').strip()
+    limit = min(max(request.args.get('limit', SEARCH_RESULT_LIMIT, type=int) or SEARCH_RESULT_LIMIT, 1), SEARCH_MAX_LIMIT)
+    started = time.perf_counter()
+    results = get_cbcs_search_index().search(query, limit) if query else []
+    return jsonify({
+        'query': query,
+        'results': results,
+        'count': len(results),
+        'took_ms': round((time.perf_counter() - started) * 1000, 2)
+    })
+
+# ---------------- Basket Progress ----------------
+TRACKED_BASKETS = ['Basket I', 'Basket II', 'Basket III', 'Basket IV', 'Basket V']
+
+def empty_basket_progress(required_credits):
+    """Progress entry of a basket the student has no subjects in"""
+    return {
+        'subjects': [],
+        'total_subjects': 0,
+        'completed_subjects': 0,
+        'required_credits': required_credits,
+        'earned_credits': 0,
+        'pending_credits': required_credits,
+        'percentage': 0,
+        'status': "Not Started",
+        'is_completed': False,
+        'has_default_subjects': False,
+        'default_assigned_count': 0
+    }
+
+def compute_basket_progress(catalogue, transcript):
+    """Match a transcript against a CBCS catalogue and return (basket_progress, overall_stats)
+
+    catalogue is the list returned by get_cbcs_catalogue(); transcript is a list of CUTM1 rows.
+    """
+    # First row per subject code supplies the semester, as the transcript is indexed once up front
+    transcript_by_code = {}
+    for row in transcript:
+        transcript_by_code.setdefault(row.get('Subject_Code'), row)
+
+    baskets = {}
+    catalogued_codes = set()
+    for entry in catalogue:
+        subjects = []
+        earned_total = 0
+        completed_count = 0
+        for subject in entry['subjects']:
+            row = transcript_by_code.get(subject['code'])
+            completed = row is not None
+            earned_credits = subject['credits_numeric'] if completed else 0
+            subjects.append({
+                'code': subject['code'],
+                'name': subject['name'],
+                'credits': subject['credits'],
+                'credits_numeric': subject['credits_numeric'],
+                'completed': completed,
+                'semester': row.get('Sem') if completed else None,
+                'earned_credits': earned_credits,
+                'original_basket': subject['original_basket'],
+                'branch': subject['branch'],
+                'is_default_assigned': False
+            })
+            if completed:
+                catalogued_codes.add(subject['code'])
+                earned_total += earned_credits
+                completed_count += 1
+        baskets[entry['_id']] = {
+            'subjects': subjects,
+            'total_subjects': len(subjects),
+            'completed_subjects': completed_count,
+            'earned_credits': earned_total
+        }
+
+    # Completed subjects missing from the catalogue count towards Basket V
+    uncategorized = []
+    for row in transcript:
+        if row.get('Subject_Code') in catalogued_codes:
+            continue
+        credits_numeric = row_credits(row)
+        uncategorized.append({
+            'code': row.get('Subject_Code'),
+            'name': row.get('Subject_Name', ''),
+            'credits': row.get('Credits', ''),
+            'credits_numeric': credits_numeric,
+            'completed': True,
+            'semester': row.get('Sem'),
+            'earned_credits': credits_numeric,
+            'original_basket': 'Unknown',
+            'branch': 'Unknown',
+            'is_default_assigned': True
+        })
+    if uncategorized:
+        basket_v = baskets.setdefault('Basket V', {'subjects': [], 'total_subjects': 0, 'completed_subjects': 0, 'earned_credits': 0})
+        basket_v['subjects'].extend(uncategorized)
+        basket_v['total_subjects'] += len(uncategorized)
+        basket_v['completed_subjects'] += len(uncategorized)
+        basket_v['earned_credits'] += sum(s['earned_credits'] for s in uncategorized)
+
+    overall_stats = {
+        'total_subjects': 0,
+        'completed_subjects': 0,
+        'total_required_credits': sum(BASKET_CREDIT_REQUIREMENTS.values()),
+        'total_earned_credits': 0,
+        'baskets_completed': 0,
+        'total_baskets': len(TRACKED_BASKETS),
+        'default_assigned_subjects': len(uncategorized)
+    }
+    basket_progress = {}
+    for basket_name in TRACKED_BASKETS:
+        required = BASKET_CREDIT_REQUIREMENTS.get(basket_name, 0)
+        basket = baskets.get(basket_name)
+        if basket is None:
+            basket_progress[basket_name] = empty_basket_progress(required)
+            continue
+
+        earned = basket['earned_credits']
+        is_completed = earned >= required
+        default_count = sum(1 for s in basket['subjects'] if s['is_default_assigned'])
+        basket_progress[basket_name] = {
+            'subjects': basket['subjects'],
+            'total_subjects': basket['total_subjects'],
+            'completed_subjects': basket['completed_subjects'],
+            'required_credits': required,
+            'earned_credits': earned,
+            'pending_credits': max(0, required - earned),
+            'percentage': round((earned / required) * 100, 1) if required > 0 else 0,
+            'status': "Completed" if is_completed else ("Not Started" if earned == 0 else "Not Completed"),
+            'is_completed': is_completed,
+            'has_default_subjects': default_count > 0,
+            'default_assigned_count': default_count
+        }
+        overall_stats['total_subjects'] += basket['total_subjects']
+        overall_stats['completed_subjects'] += basket['completed_subjects']
+        overall_stats['total_earned_credits'] += earned
+        if is_completed:
+            overall_stats['baskets_completed'] += 1
+
+    total_required = overall_stats['total_required_credits']
+    overall_stats['percentage'] = round((overall_stats['total_earned_credits'] / total_required) * 100, 1) if total_required > 0 else 0
+    overall_stats['overall_status'] = "Completed" if overall_stats['baskets_completed'] == overall_stats['total_baskets'] else "In Progress"
+    return basket_progress, overall_stats
+
 # ---------------- Main Basket Track Route ----------------
 
 @app.route('/baskettrack', methods=['GET', 'POST'])
@@ -3063,13 +4609,13 @@ def baskettrack():
                 
                 # Get student's branch
                 branch = get_branch_from_reg_no(registration)
-                branch_short = branch.split() if branch != "Unknown Branch" else "Unknown"
-                print(f"DEBUG - Student branch: {branch} ({branch_short})")
+                branch_code = get_branch_code_from_reg_no(registration)
+                print(f"DEBUG - Student branch: {branch} ({branch_code})")
                 
                 # Get all student subjects
                 student_query = {"Reg_No": registration}
                 all_student_subjects = list(cutm_collection.find(student_query, {
-                    "Subject_Code": 1, "Subject_Name": 1, "Grade": 1, "Sem": 1, "Credits": 1, "_id": 0
+                    "Subject_Code": 1, "Subject_Name": 1, "Grade": 1, "Sem": 1, "Credits": 1, "Credits_Total": 1, "_id": 0
                 }))
                 print(f"DEBUG - Found {len(all_student_subjects)} total student subjects")
                 
@@ -3078,266 +4624,11 @@ def baskettrack():
                     all_student_subjects = [subj for subj in all_student_subjects if subj.get('Sem') in selected_semesters]
                     print(f"DEBUG - After semester filter: {len(all_student_subjects)} subjects")
                 
-                # **SIMPLIFIED APPROACH: Use Python for credits parsing**
-                # Get CBCS data without complex aggregation
-                pipeline = []
-                
-                # Step 1: Enhanced branch matching
-                branch_match_conditions = [
-                    {"Branch": "All"},
-                    {"Branch": branch_short}
-                ]
-                
-                # Add regex patterns for combined branches
-                if branch_short != "Unknown":
-                    branch_match_conditions.extend([
-                        {"Branch": {"$regex": f".*{branch_short}.*", "$options": "i"}},
-                        {"Branch": {"$regex": f"{branch_short}.*", "$options": "i"}},
-                        {"Branch": {"$regex": f".*{branch_short}", "$options": "i"}}
-                    ])
-                
-                match_stage = {"$match": {"$or": branch_match_conditions}}
-                if basket and basket != 'All':
-                    match_stage["$match"]["Basket"] = basket
-                
-                pipeline.append(match_stage)
-                
-                # Step 2: **FIXED** Basket normalization only
-                pipeline.append({
-                    "$addFields": {
-                        "assigned_basket": {
-                            "$switch": {
-                                "branches": [
-                                    # Handle numeric formats
-                                    {"case": {"$eq": ["$Basket", "Basket 1"]}, "then": "Basket I"},
-                                    {"case": {"$eq": ["$Basket", "Basket 2"]}, "then": "Basket II"},
-                                    {"case": {"$eq": ["$Basket", "Basket 3"]}, "then": "Basket III"},
-                                    {"case": {"$eq": ["$Basket", "Basket 4"]}, "then": "Basket IV"},
-                                    {"case": {"$eq": ["$Basket", "Basket 5"]}, "then": "Basket V"},
-                                    # Handle Roman numeral formats
-                                    {"case": {"$eq": ["$Basket", "Basket I"]}, "then": "Basket I"},
-                                    {"case": {"$eq": ["$Basket", "Basket II"]}, "then": "Basket II"},
-                                    {"case": {"$eq": ["$Basket", "Basket III"]}, "then": "Basket III"},
-                                    {"case": {"$eq": ["$Basket", "Basket IV"]}, "then": "Basket IV"},
-                                    {"case": {"$eq": ["$Basket", "Basket V"]}, "then": "Basket V"}
-                                ],
-                                "default": {
-                                    "$cond": {
-                                        "if": {
-                                            "$and": [
-                                                {"$ne": ["$Basket", ""]},
-                                                {"$ne": ["$Basket", None]},
-                                                {"$ne": ["$Basket", "null"]}
-                                            ]
-                                        },
-                                        "then": "$Basket",
-                                        "else": "Basket V"
-                                    }
-                                }
-                            }
-                        }
-                    }
-                })
-                
-                # Step 3: Simple grouping by basket - no complex credit parsing in MongoDB
-                pipeline.append({
-                    "$group": {
-                        "_id": "$assigned_basket",
-                        "subjects": {
-                            "$push": {
-                                "code": "$Subject Code",
-                                 "name": "$Subject_name",   # Handles both variations
-                                "credits": "$Credits",
-                                "original_basket": "$Basket",
-                                "branch": "$Branch"
-                            }
-                        },
-                        "total_subjects": {"$sum": 1}
-                    }
-                })
-                
-                pipeline.append({"$sort": {"_id": 1}})
+                # Catalogue is cached per branch and only rebuilt after basket writes
+                cbcs_basket_data = get_cbcs_catalogue(branch_code, basket)
+                print(f"DEBUG - Catalogue returned {len(cbcs_basket_data)} baskets")
                 
-                print(f"DEBUG - Executing simplified aggregation pipeline with {len(pipeline)} stages")
-                
-                # Execute CBCS aggregation
-                cbcs_basket_data = list(cbcs_collection.aggregate(pipeline))
-                print(f"DEBUG - Aggregation returned {len(cbcs_basket_data)} baskets")
-                
-                # **Process in Python - much more reliable**
-                student_subject_codes = {subj.get('Subject_Code') for subj in all_student_subjects}
-                
-                # Process each basket's subjects
-                for basket in cbcs_basket_data:
-                    basket_subjects = []
-                    total_earned_credits = 0
-                    completed_subjects_count = 0
-                    
-                    for subject in basket.get('subjects', []):
-                        subject_code = subject.get('code')
-                        
-                        # Check if student has completed this subject
-                        completed = subject_code in student_subject_codes
-                        
-                        # Parse credits using Python function
-                        credits_numeric = parse_credits_normalized(subject.get('credits', ''))
-                        earned_credits = credits_numeric if completed else 0
-                        
-                        # Get student's semester for this subject
-                        student_semester = None
-                        if completed:
-                            for student_subj in all_student_subjects:
-                                if student_subj.get('Subject_Code') == subject_code:
-                                    student_semester = student_subj.get('Sem')
-                                    break
-                        
-                        processed_subject = {
-                            'code': subject_code,
-                            'name': subject.get('name', ''),
-                            'credits': subject.get('credits', ''),
-                            'credits_numeric': credits_numeric,
-                            'completed': completed,
-                            'semester': student_semester,
-                            'earned_credits': earned_credits,
-                            'original_basket': subject.get('original_basket'),
-                            'branch': subject.get('branch'),
-                            'is_default_assigned': False
-                        }
-                        
-                        basket_subjects.append(processed_subject)
-                        
-                        if completed:
-                            total_earned_credits += earned_credits
-                            completed_subjects_count += 1
-                    
-                    # Update basket data
-                    basket['subjects'] = basket_subjects
-                    basket['completed_subjects'] = completed_subjects_count
-                    basket['total_earned_credits'] = total_earned_credits
-                
-                print(f"DEBUG - Processed baskets with credits:")
-                for basket in cbcs_basket_data:
-                    print(f"  - {basket.get('_id')}: {basket.get('total_earned_credits')} earned credits")
-                
-                # Find uncategorized subjects (completed but not in CBCS)
-                completed_subject_codes = set()
-                for basket in cbcs_basket_data:
-                    for subject in basket.get('subjects', []):
-                        if subject.get('completed'):
-                            completed_subject_codes.add(subject.get('code'))
-                
-                uncategorized_codes = student_subject_codes - completed_subject_codes
-                uncategorized_subjects = []
-                
-                for subj in all_student_subjects:
-                    if subj.get('Subject_Code') in uncategorized_codes:
-                        credits_numeric = parse_credits_normalized(subj.get('Credits', ''))
-                        uncategorized_subjects.append({
-                            'code': subj.get('Subject_Code'),
-                            'name': subj.get('Subject_Name', ''),
-                            'credits': subj.get('Credits', ''),
-                            'credits_numeric': credits_numeric,
-                            'completed': True,
-                            'semester': subj.get('Sem'),
-                            'earned_credits': credits_numeric,
-                            'original_basket': 'Unknown',
-                            'branch': 'Unknown',
-                            'is_default_assigned': True
-                        })
-                
-                print(f"DEBUG - Found {len(uncategorized_subjects)} uncategorized subjects")
-                
-                # Add uncategorized subjects to Basket V
-                if uncategorized_subjects:
-                    basket_v_found = False
-                    for basket in cbcs_basket_data:
-                        if basket['_id'] == 'Basket V':
-                            basket['subjects'].extend(uncategorized_subjects)
-                            basket['total_subjects'] += len(uncategorized_subjects)
-                            basket['completed_subjects'] += len(uncategorized_subjects)
-                            basket['total_earned_credits'] += sum(s['earned_credits'] for s in uncategorized_subjects)
-                            basket_v_found = True
-                            break
-                    
-                    if not basket_v_found:
-                        new_basket_v = {
-                            '_id': 'Basket V',
-                            'subjects': uncategorized_subjects,
-                            'total_subjects': len(uncategorized_subjects),
-                            'completed_subjects': len(uncategorized_subjects),
-                            'total_earned_credits': sum(s['earned_credits'] for s in uncategorized_subjects)
-                        }
-                        cbcs_basket_data.append(new_basket_v)
-                
-                # Ensure ALL baskets are present
-                all_baskets = ['Basket I', 'Basket II', 'Basket III', 'Basket IV', 'Basket V']
-                basket_dict = {basket['_id']: basket for basket in cbcs_basket_data if basket.get('_id')}
-                
-                # Initialize overall statistics
-                overall_stats = {
-                    'total_subjects': 0,
-                    'completed_subjects': 0,
-                    'total_required_credits': sum(BASKET_CREDIT_REQUIREMENTS.values()),
-                    'total_earned_credits': 0,
-                    'baskets_completed': 0,
-                    'total_baskets': len(all_baskets),
-                    'default_assigned_subjects': len(uncategorized_subjects)
-                }
-                
-                # Process ALL baskets
-                for basket_name in all_baskets:
-                    basket_required_credits = BASKET_CREDIT_REQUIREMENTS.get(basket_name, 0)
-                    
-                    if basket_name in basket_dict:
-                        basket = basket_dict[basket_name]
-                        basket_earned_credits = basket.get('total_earned_credits', 0)
-                        
-                        completion_percentage = round((basket_earned_credits / basket_required_credits) * 100, 1) if basket_required_credits > 0 else 0
-                        is_basket_completed = basket_earned_credits >= basket_required_credits
-                        status = "Completed" if is_basket_completed else ("Not Started" if basket_earned_credits == 0 else "Not Completed")
-                        
-                        default_count = sum(1 for s in basket.get('subjects', []) if s.get('is_default_assigned', False))
-                        
-                        basket_progress[basket_name] = {
-                            'subjects': basket.get('subjects', []),
-                            'total_subjects': basket.get('total_subjects', 0),
-                            'completed_subjects': basket.get('completed_subjects', 0),
-                            'required_credits': basket_required_credits,
-                            'earned_credits': basket_earned_credits,
-                            'pending_credits': max(0, basket_required_credits - basket_earned_credits),
-                            'percentage': completion_percentage,
-                            'status': status,
-                            'is_completed': is_basket_completed,
-                            'has_default_subjects': default_count > 0,
-                            'default_assigned_count': default_count
-                        }
-                        
-                        # Update overall statistics
-                        overall_stats['total_subjects'] += basket.get('total_subjects', 0)
-                        overall_stats['completed_subjects'] += basket.get('completed_subjects', 0)
-                        overall_stats['total_earned_credits'] += basket_earned_credits
-                        
-                        if is_basket_completed:
-                            overall_stats['baskets_completed'] += 1
-                    else:
-                        # Create empty basket data for missing baskets
-                        basket_progress[basket_name] = {
-                            'subjects': [],
-                            'total_subjects': 0,
-                            'completed_subjects': 0,
-                            'required_credits': basket_required_credits,
-                            'earned_credits': 0,
-                            'pending_credits': basket_required_credits,
-                            'percentage': 0,
-                            'status': "Not Started",
-                            'is_completed': False,
-                            'has_default_subjects': False,
-                            'default_assigned_count': 0
-                        }
-                
-                # Calculate final statistics
-                overall_stats['percentage'] = round((overall_stats['total_earned_credits'] / overall_stats['total_required_credits']) * 100, 1) if overall_stats['total_required_credits'] > 0 else 0
-                overall_stats['overall_status'] = "Completed" if overall_stats['baskets_completed'] == overall_stats['total_baskets'] else "In Progress"
+                basket_progress, overall_stats = compute_basket_progress(cbcs_basket_data, all_student_subjects)
                 
                 # Prepare final student data
                 student_data = {
@@ -3363,6 +4654,95 @@ def baskettrack():
         traceback.print_exc()
         return render_template('baskettrack.html', error=f"System error: {str(e)}", filters=filters)
 
+# ---------------- Cohort Basket Report ----------------
+COHORT_TRANSCRIPT_PROJECTION = {"_id": 0, "Reg_No": 1, "Name": 1, "Subject_Code": 1, "Credits": 1, "Credits_Total": 1}
+COHORT_REPORT_COLUMNS = (
+    [('Reg_No', 'Reg No'), ('Name', 'Name')]
+    + [(basket, f"{basket} ({BASKET_CREDIT_REQUIREMENTS[basket]})") for basket in TRACKED_BASKETS]
+    + [('Total_Earned', 'Earned'), ('Percentage', '%'), ('Baskets_Completed', 'Baskets Done')]
+)
+
+def compute_cohort_basket_report(transcript, catalogue):
+    """Per-student earned credits in every basket, joined in bulk like compute_basket_progress()"""
+    columns = ['Reg_No', 'Name'] + TRACKED_BASKETS + ['Total_Earned', 'Percentage', 'Baskets_Completed', 'Status']
+    records = list(transcript)
+    if not records:
+        return pd.DataFrame(columns=columns)
+    rows = pd.DataFrame(records, columns=['Reg_No', 'Name', 'Subject_Code'])
+    rows['Credits_Numeric'] = [row_credits(row) for row in records]
+
+    subjects = pd.DataFrame(
+        [(entry['_id'], s['code'], s['credits_numeric']) for entry in catalogue for s in entry['subjects']],
+        columns=['Basket', 'Subject_Code', 'Catalogue_Credits']
+    )
+
+    # Catalogued subjects count once per student at catalogue credits; anything else is Basket V at row credits
+    completed = rows.drop_duplicates(['Reg_No', 'Subject_Code'])[['Reg_No', 'Subject_Code']]
+    matched = completed.merge(subjects, on='Subject_Code')
+    uncategorized = rows[~rows['Subject_Code'].isin(subjects['Subject_Code'])]
+    earned = pd.concat([
+        matched[['Reg_No', 'Basket']].assign(Earned=matched['Catalogue_Credits']),
+        uncategorized[['Reg_No']].assign(Basket='Basket V', Earned=uncategorized['Credits_Numeric'])
+    ])
+
+    report = (earned.groupby(['Reg_No', 'Basket'])['Earned'].sum()
+              .unstack(fill_value=0)
+              .reindex(index=sorted(rows['Reg_No'].unique()), columns=TRACKED_BASKETS, fill_value=0))
+    required = pd.Series({basket: BASKET_CREDIT_REQUIREMENTS.get(basket, 0) for basket in TRACKED_BASKETS})
+    total_required = sum(BASKET_CREDIT_REQUIREMENTS.values())
+
+    report['Total_Earned'] = report[TRACKED_BASKETS].sum(axis=1)
+    report['Percentage'] = (report['Total_Earned'] / total_required * 100).round(1) if total_required else 0
+    report['Baskets_Completed'] = report[TRACKED_BASKETS].ge(required).sum(axis=1)
+    report['Status'] = np.where(report['Baskets_Completed'] == len(TRACKED_BASKETS), 'Completed', 'In Progress')
+    names = rows[rows['Name'].fillna('') != ''].drop_duplicates('Reg_No').set_index('Reg_No')['Name']
+    report['Name'] = names.reindex(report.index).fillna('')
+    return report.rename_axis('Reg_No').reset_index()[columns]
+
+def iter_cohort_report_rows(report):
+    """CSV rows of a cohort basket report"""
+    for row in report.itertuples(index=False):
+        yield list(row)
+
+@app.route('/baskettrack/cohort')
+def baskettrack_cohort():
+    """Basket completion of every student in a batch and branch"""
+    batch = (request.args.get('batch') or "").strip()
+    department = (request.args.get('department') or "").strip()
+    sort = request.args.get('sort') if request.args.get('sort') in dict(COHORT_REPORT_COLUMNS) else 'Reg_No'
+    descending = request.args.get('order') == 'desc'
+    context = {'batch': batch, 'department': department, 'sort': sort, 'order': 'desc' if descending else 'asc',
+               'columns': COHORT_REPORT_COLUMNS, 'baskets': TRACKED_BASKETS, 'requirements': BASKET_CREDIT_REQUIREMENTS}
+    if not batch and not department:
+        return render_template('baskettrack_cohort.html', **context)
+
+    branch_code = BRANCH_ALIASES.get(department.lower())
+    if not (batch.isdigit() and len(batch) in (2, 4)) or not branch_code:
+        return render_template('baskettrack_cohort.html', error="Select a batch (e.g. 21 or 2021) and a department.", **context)
+
+    try:
+        started = time.time()
+        batch_year = f"20{batch[-2:]}"
+        transcript = cutm_collection.find({"Batch_Year": batch_year, "Branch_Code": branch_code}, COHORT_TRANSCRIPT_PROJECTION)
+        report = compute_cohort_basket_report(transcript, get_cbcs_catalogue(branch_code))
+        report = report.sort_values([sort, 'Reg_No'], ascending=[not descending, True], kind='mergesort')
+
+        if request.args.get('format') == 'csv':
+            filename = f"basket_report_{batch_year}_{get_branch_short_from_code(branch_code)}.csv"
+            return Response(stream_with_context(stream_csv(iter_cohort_report_rows(report), list(report.columns))),
+                            mimetype='text/csv',
+                            headers={'Content-Disposition': f'attachment; filename={filename}'})
+
+        return render_template('baskettrack_cohort.html',
+                               students=report.to_dict('records'),
+                               branch=BRANCH_NAMES[branch_code],
+                               batch_year=batch_year,
+                               elapsed=round(time.time() - started, 2),
+                               **context)
+    except Exception as e:
+        print(f"ERROR in baskettrack_cohort: {str(e)}")
+        return render_template('baskettrack_cohort.html', error=f"System error: {str(e)}", **context)
+
 # ---------------- Additional Helper Routes ----------------
 
 @app.route('/api/basket_requirements')
@@ -3376,19 +4756,13 @@ def debug_baskets(registration):
     try:
         # Get student's branch
         branch = get_branch_from_reg_no(registration)
-        branch_short = branch.split()[0] if branch != 'Unknown Branch' else 'Unknown'
+        branch_code = get_branch_code_from_reg_no(registration)
+        branch_short = get_branch_short_from_code(branch_code)
         
         # Check CBCS subjects for this branch
-        branch_conditions = [
-            {"Branch": "All"},
-            {"Branch": branch_short},
-            {"Branch": {"$regex": f".*{branch_short}.*", "$options": "i"}}
-        ]
-        
-        cbcs_subjects = list(cbcs_collection.find({
-            "$or": branch_conditions
-        }, {
+        cbcs_subjects = list(cbcs_collection.find(cbcs_branch_query(branch_code), {
             "Branch": 1,
+            "Branch_Tokens": 1,
             "Basket": 1,
             "Subject Code": 1,
             "Subject_name": 1,
@@ -3467,7 +4841,7 @@ def debug_baskets(registration):
             
             <div class="section">
                 <h2>Branch Match Conditions Used</h2>
-                <pre>{branch_conditions}</pre>
+                <pre>{cbcs_branch_query(branch_code)}</pre>
             </div>
         </body>
         </html>
@@ -3512,7 +4886,7 @@ def ajax_get_registrations():
             
             branch_code = branch_mapping.get(department)
             if branch_code:
-                query['Reg_No'] = {'$regex': f'^.{{{7}}}{branch_code}'}
+                query['Branch_Code'] = branch_code
         
         registrations = cutm_collection.distinct('Reg_No', query)
         
@@ -3534,10 +4908,14 @@ def ajax_get_semesters():
         if not registration or registration == 'All':
             return '<option value="">Select Semester</option><option value="All">All Semesters</option>'
         
-        semesters = sorted(set(doc["Sem"] for doc in cutm_collection.find(
-            {"Reg_No": registration}, 
-            {"Sem": 1, "_id": 0}
-        ) if doc.get("Sem")))
+        summary = get_student_summary(registration)
+        if summary:
+            semesters = summary.get("Semesters", [])
+        else:
+            semesters = sorted(set(doc["Sem"] for doc in cutm_collection.find(
+                {"Reg_No": registration}, 
+                {"Sem": 1, "_id": 0}
+            ) if doc.get("Sem")))
         
         options = ['<option value="">Select Semester</option>']
         options.append('<option value="All">All Semesters</option>')